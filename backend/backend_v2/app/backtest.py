@@ -0,0 +1,180 @@
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pypfopt.efficient_frontier import EfficientFrontier
+from pypfopt.exceptions import OptimizationError
+
+from .data import get_price_df
+from .encoding import encode_points
+
+# Walk-forward rebalancing backtest of the portfolio optimizer.
+#
+# Prices are loaded once and turned into one aligned simple-return matrix.
+# At each rebalance (close of the last bar of each week/month/quarter, or
+# every N bars) the optimizer sees the trailing `lookback` returns. Window
+# moments are kept as running sums (returns, cross-products, log growth)
+# that only add the bars entering and drop the bars leaving the window, and
+# reproduce pypfopt's mean_historical_return / sample_cov. The optimizations
+# are independent and run in a process pool; holdings then drift with
+# prices between rebalances. Each call starts its own pool, so the default
+# worker count stays small; BACKTEST_WORKERS raises it on dedicated hosts.
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(min(2, os.cpu_count() or 1))))
+OBJECTIVES = ("max_sharpe", "min_volatility")
+_FREQS = {"weekly": "W", "monthly": "M", "quarterly": "Q"}
+
+def _rebalance_rows(dates: pd.DatetimeIndex, rebalance: str, first: int) -> List[int]:
+    r = str(rebalance).strip().lower()
+    if r.isdigit():
+        step = int(r)
+        if step < 1:
+            raise ValueError("rebalance step must be >= 1 bar")
+        return list(range(first, len(dates), step))
+    if r not in _FREQS:
+        raise ValueError(f"rebalance must be one of {', '.join(_FREQS)} or a number of bars")
+    # calendar labels of the local dates; to_period would warn about dropping the tz
+    local = dates.tz_localize(None) if dates.tz is not None else dates
+    labels = local.to_period(_FREQS[r]).asi8
+    ends = np.flatnonzero(labels[:-1] != labels[1:])
+    return [first] + [int(i) for i in ends if i > first]
+
+def _window_moments(R: np.ndarray, rows: List[int], lookback: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    # Annualized (mu, S) over R[p-lookback+1 : p+1] for each rebalance row p.
+    L = lookback
+    logg = np.log1p(R)
+    out = []
+    prev = None
+    for p in rows:
+        lo, hi = p - L + 1, p + 1
+        if prev is None or p - prev >= L:
+            W = R[lo:hi]
+            s, P, g = W.sum(axis=0), W.T @ W, logg[lo:hi].sum(axis=0)
+        else:
+            add, drop = slice(prev + 1, hi), slice(prev - L + 1, lo)
+            s = s + R[add].sum(axis=0) - R[drop].sum(axis=0)
+            P = P + R[add].T @ R[add] - R[drop].T @ R[drop]
+            g = g + logg[add].sum(axis=0) - logg[drop].sum(axis=0)
+        prev = p
+        mu = np.expm1(g * 252.0 / L)
+        S = (P - np.outer(s, s) / L) / (L - 1) * 252.0
+        out.append((mu, S))
+    return out
+
+def _optimize(mu: np.ndarray, S: np.ndarray, objective: str, risk_free_rate: float) -> Tuple[np.ndarray, bool]:
+    # Returns (weights, fell_back). max_sharpe is infeasible when no asset
+    # beats the risk-free rate; those windows hold the min-volatility portfolio.
+    S = (S + S.T) / 2
+    if objective == "max_sharpe":
+        try:
+            ef = EfficientFrontier(mu, S)
+            ef.max_sharpe(risk_free_rate=risk_free_rate)
+            return np.asarray(ef.weights, dtype=float), False
+        except (OptimizationError, ValueError):
+            pass
+    ef = EfficientFrontier(mu, S)
+    ef.min_volatility()
+    return np.asarray(ef.weights, dtype=float), objective != "min_volatility"
+
+def _optimize_task(args: tuple) -> Tuple[np.ndarray, bool]:
+    return _optimize(*args)
+
+def backtest_portfolio(
+    tickers: List[str],
+    period: str = "10y",
+    lookback: int = 252,
+    rebalance: str = "monthly",
+    objective: str = "max_sharpe",
+    risk_free_rate: float = 0.02,
+    cost_bps: float = 0.0,
+    workers: Optional[int] = None,
+    points_format: str = "records",
+) -> dict:
+    if not tickers or len(tickers) < 2:
+        raise ValueError("Provide at least 2 tickers")
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of: {', '.join(OBJECTIVES)}")
+    if lookback < 20:
+        raise ValueError("lookback must be at least 20 bars")
+
+    prices = get_price_df(tickers, period=period)
+    px = prices.loc[:, prices.notna().mean() >= 0.95].ffill(limit=5).dropna()
+    if px.shape[1] < 2:
+        raise ValueError("Not enough valid tickers with aligned history")
+    rets = px.pct_change().iloc[1:]
+    R = np.ascontiguousarray(rets.to_numpy(dtype=np.float64))
+    T, n = R.shape
+    if T <= lookback:
+        raise ValueError(f"Not enough history for lookback={lookback} ({T} return bars)")
+
+    rows = [p for p in _rebalance_rows(rets.index, rebalance, lookback - 1) if p < T - 1]
+    moments = _window_moments(R, rows, lookback)
+    tasks = [(mu, S, objective, risk_free_rate) for mu, S in moments]
+
+    workers = min(BACKTEST_WORKERS if workers is None else workers, len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            solved = list(pool.map(_optimize_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        solved = [_optimize_task(t) for t in tasks]
+
+    # Hold each allocation from the bar after its rebalance to the next one.
+    start = rows[0] + 1
+    port = np.empty(T - start)
+    held = np.zeros(n)
+    turnover = []
+    cost = cost_bps / 1e4
+    for k, (p, (w, _)) in enumerate(zip(rows, solved)):
+        end = rows[k + 1] + 1 if k + 1 < len(rows) else T
+        traded = float(np.abs(w - held).sum())
+        turnover.append(traded / 2)
+        G = np.cumprod(1.0 + R[p + 1:end], axis=0)
+        V = G @ w
+        seg = np.diff(np.concatenate([[1.0], V])) / np.concatenate([[1.0], V[:-1]])
+        seg[0] -= cost * traded
+        port[p + 1 - start:end - start] = seg
+        held = w * G[-1] / V[-1]
+
+    equity = np.cumprod(1.0 + port)
+    drawdown = equity / np.maximum.accumulate(equity) - 1.0
+    years = len(port) / 252.0
+    vol = float(port.std(ddof=1) * np.sqrt(252)) if len(port) > 1 else 0.0
+    ann_ret = float(equity[-1] ** (1 / years) - 1) if years > 0 else 0.0
+
+    names = list(px.columns)
+    dates = rets.index
+    out = pd.DataFrame({
+        "date": dates[start:].strftime("%Y-%m-%d"),
+        "equity": equity,
+        "drawdown": drawdown,
+        "ret": port,
+    })
+
+    return {
+        "tickers": names,
+        "dropped": [t for t in tickers if t not in names],
+        "objective": objective,
+        "lookback": lookback,
+        "rebalance": rebalance,
+        "n_rebalances": len(rows),
+        "fallbacks": int(sum(fb for _, fb in solved)),
+        "summary": {
+            "total_return": round(float(equity[-1] - 1) * 100, 4),
+            "annual_return": round(ann_ret * 100, 4),
+            "volatility": round(vol * 100, 4),
+            "sharpe": round((ann_ret - risk_free_rate) / vol, 4) if vol > 0 else None,
+            "max_drawdown": round(float(drawdown.min()) * 100, 4),
+            "avg_turnover": round(float(np.mean(turnover[1:])) * 100, 4) if len(turnover) > 1 else 0.0,
+        },
+        "rebalances": [
+            {
+                "date": dates[p].strftime("%Y-%m-%d"),
+                "turnover": round(to, 4),
+                "weights": {t: round(float(x), 5) for t, x in zip(names, w) if abs(x) > 1e-4},
+            }
+            for p, (w, _), to in zip(rows, solved, turnover)
+        ],
+        "points": encode_points(out, points_format),
+    }
@@ -0,0 +1,260 @@
+from __future__ import annotations
+import os
+import json
+import time
+import zlib
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .data import (INTERVAL_SECONDS, SESSION_SECONDS, _atomic_save, _period_to_days, _store_base, _store_ttl,
+                   date_labels, normalize_interval)
+
+# Intraday OHLCV bars.
+#
+# Only a few source intervals are fetched and stored (SOURCE_LOOKBACK_DAYS,
+# with how far back yfinance serves each); any other interval is resampled
+# on the fly from the coarsest source that divides it and covers the period,
+# e.g. 15m/30m from 5m and 4h/1d from 1h. Requests reaching past a source's
+# lookback are clamped to it.
+#
+# The store keeps one directory per provider/source/ticker with a monthly
+# chunk of (UTC ns dates, float64 [open, high, low, close, volume]) .npy
+# files plus a meta.json. Minute data is ~400x daily, so chunking keeps an
+# append to rewriting the current month only, and a read to memory-mapping
+# the months the window touches.
+FIELDS = ("open", "high", "low", "close", "volume")
+SOURCE_LOOKBACK_DAYS = {"1m": 7, "5m": 59, "1h": 729}
+SESSION_OPEN_UTC = timedelta(hours=13, minutes=30)  # mock sessions only
+
+_write_lock = threading.Lock()
+
+def source_interval(interval: str, period: str) -> Tuple[str, int]:
+    # -> (stored interval to resample from, days of history it can serve)
+    interval = normalize_interval(interval)
+    sec = INTERVAL_SECONDS[interval]
+    candidates = sorted((s for s in SOURCE_LOOKBACK_DAYS if sec % INTERVAL_SECONDS[s] == 0),
+                        key=lambda s: -INTERVAL_SECONDS[s])
+    if not candidates:
+        raise ValueError(f"No source interval for {interval} bars")
+    days = _period_to_days(period)
+    for s in candidates:
+        if days <= SOURCE_LOOKBACK_DAYS[s]:
+            return s, days
+    best = max(candidates, key=lambda s: SOURCE_LOOKBACK_DAYS[s])
+    return best, SOURCE_LOOKBACK_DAYS[best]
+
+def resample_ohlc(df: pd.DataFrame, interval: str) -> pd.DataFrame:
+    sec = INTERVAL_SECONDS[normalize_interval(interval)]
+    if len(df) < 2 or int(np.diff(pd.DatetimeIndex(df.index).as_unit("ns").asi8).min()) >= sec * 10**9:
+        return df
+    out = df.resample(f"{sec}s", label="left", closed="left").agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+    return out.dropna(subset=["close"])
+
+# ---- chunked store ----
+def _read_meta(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _read_chunk(path: str, month: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    try:
+        dates = np.load(os.path.join(path, f"{month}.dates.npy"), mmap_mode="r")
+        values = np.load(os.path.join(path, f"{month}.ohlcv.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if len(dates) != len(values):
+        return None  # caught between the two replaces of a concurrent write
+    return dates, values
+
+def _month(ns) -> np.ndarray:
+    return np.asarray(ns, dtype="datetime64[ns]").astype("datetime64[M]")
+
+def load_bars(provider: str, source: str, ticker: str, start_ns: int) -> Tuple[pd.DataFrame, Optional[dict]]:
+    path = _store_base(provider, source, ticker)
+    meta = _read_meta(path)
+    if meta is None:
+        return pd.DataFrame(columns=list(FIELDS)), None
+    first = str(_month(start_ns)).replace("-", "")
+    months = sorted(f[:6] for f in os.listdir(path) if f.endswith(".dates.npy") and f[:6] >= first)
+    dates, values = [], []
+    for m in months:
+        chunk = _read_chunk(path, m)
+        if chunk is None:
+            continue
+        d, v = chunk
+        i = int(np.searchsorted(d, start_ns, side="left"))
+        dates.append(np.asarray(d[i:]))
+        values.append(np.asarray(v[i:]))
+    if not dates:
+        return pd.DataFrame(columns=list(FIELDS)), meta
+    idx = pd.to_datetime(np.concatenate(dates), utc=True)
+    return pd.DataFrame(np.concatenate(values), index=idx, columns=list(FIELDS)), meta
+
+def _store_bars(provider: str, source: str, ticker: str, df: pd.DataFrame, fetched_from: int) -> None:
+    df = df.dropna(subset=["close"])
+    dates = pd.DatetimeIndex(df.index).as_unit("ns").asi8
+    values = df[list(FIELDS)].to_numpy(dtype=np.float64)
+    months = _month(dates)
+    path = _store_base(provider, source, ticker)
+    with _write_lock:
+        meta = _read_meta(path) or {}
+        try:
+            os.makedirs(path, exist_ok=True)
+            for m in np.unique(months):
+                sel = months == m
+                name = str(m).replace("-", "")
+                new_d, new_v = dates[sel], values[sel]
+                old = _read_chunk(path, name)
+                if old is not None:
+                    # new rows win: the last stored bar may still have been forming
+                    keep = ~np.isin(old[0], new_d)
+                    new_d = np.concatenate([np.asarray(old[0])[keep], new_d])
+                    new_v = np.concatenate([np.asarray(old[1])[keep], new_v])
+                    order = np.argsort(new_d, kind="stable")
+                    new_d, new_v = new_d[order], new_v[order]
+                _atomic_save(os.path.join(path, f"{name}.dates.npy"), new_d)
+                _atomic_save(os.path.join(path, f"{name}.ohlcv.npy"), new_v)
+            meta = {
+                "covered_from": int(min(fetched_from, int(meta.get("covered_from", fetched_from)))),
+                "last": int(max(int(dates[-1]) if len(dates) else 0, int(meta.get("last", 0)))),
+                "updated_at": time.time(),
+            }
+            tmp = os.path.join(path, f"meta.json.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(path, "meta.json"))
+        except OSError:
+            pass
+
+# ---- providers ----
+def _fetch_yfinance_bars(tickers: List[str], start: datetime, source: str) -> Dict[str, pd.DataFrame]:
+    import yfinance as yf  # deferred: heavy import, and not needed for store hits
+    df = yf.download(
+        tickers=tickers,
+        start=start.strftime("%Y-%m-%d"),
+        interval="60m" if source == "1h" else source,
+        group_by="column",
+        auto_adjust=True,
+        prepost=False,
+        threads=False,
+        progress=False,
+    )
+    if df is None or len(df) == 0:
+        raise ValueError("No data returned from yfinance")
+    df.index = pd.to_datetime(df.index, utc=True)
+    out = {}
+    for t in tickers:
+        cols = {}
+        for f in FIELDS:
+            key = (f.capitalize(), t) if isinstance(df.columns, pd.MultiIndex) else f.capitalize()
+            if key in df.columns:
+                cols[f] = df[key]
+        if "close" not in cols:
+            continue
+        bars = pd.DataFrame(cols).reindex(columns=list(FIELDS)).astype(float).dropna(subset=["close"])
+        if len(bars):
+            out[t] = bars.sort_index()
+    return out
+
+def _mock_bars(ticker: str, start_ns: int, source: str) -> pd.DataFrame:
+    sec = INTERVAL_SECONDS[source]
+    per_day = int(np.ceil(SESSION_SECONDS / sec))
+    days = pd.bdate_range(pd.Timestamp(start_ns, tz="UTC").normalize(), pd.Timestamp.now(tz="UTC").normalize(), tz="UTC")
+    offsets = (np.arange(per_day) * sec + int(SESSION_OPEN_UTC.total_seconds())) * 10**9
+    stamps = (days.as_unit("ns").asi8[:, None] + offsets[None, :]).ravel()
+    idx = pd.to_datetime(stamps[stamps <= time.time_ns()], unit="ns", utc=True)
+    rng = np.random.default_rng(zlib.crc32(f"{ticker}:{source}".encode("utf-8")))
+    scale = 0.02 * np.sqrt(sec / SESSION_SECONDS)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0, scale, len(idx))))
+    open_ = np.concatenate([[100.0], close[:-1]])
+    wick = np.abs(rng.normal(0.0, scale / 2, (2, len(idx))))
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) * (1 + wick[0]),
+        "low": np.minimum(open_, close) * (1 - wick[1]),
+        "close": close,
+        "volume": rng.integers(1_000, 100_000, len(idx)).astype(float),
+    }, index=idx)
+
+def load_bar_frames(provider: str, tks: List[str], period: str, interval: str, start_ns: int,
+                    max_age: Optional[float] = None, allow_mock: bool = True) -> Dict[str, pd.DataFrame]:
+    interval = normalize_interval(interval)
+    source, days = source_interval(interval, period)
+    max_age = _store_ttl(interval) if max_age is None else max_age
+    now = datetime.now(timezone.utc)
+    start_ns = max(start_ns, int(pd.Timestamp(now - timedelta(days=days)).as_unit("ns").value))
+
+    # same plan as the daily store: full window for missing/short history,
+    # from the last stored bar for stale series
+    windows: Dict[int, List[str]] = {}
+    missing = set()
+    for t in tks:
+        meta = _read_meta(_store_base(provider, source, t))
+        if meta is None or int(meta.get("covered_from", start_ns)) > start_ns:
+            windows.setdefault(start_ns, []).append(t)
+            missing.add(t)
+        elif now.timestamp() - float(meta.get("updated_at", 0)) > max_age:
+            windows.setdefault(max(start_ns, int(meta.get("last", start_ns))), []).append(t)
+
+    errors = []
+    if provider in ("auto", "yfinance"):
+        for win_ns, group in sorted(windows.items()):
+            t0 = time.perf_counter()
+            try:
+                got = _fetch_yfinance_bars(group, pd.Timestamp(win_ns, tz="UTC").to_pydatetime(), source)
+            except Exception as e:
+                errors.append(f"yfinance: {e}")
+                metrics.PROVIDER_REQUESTS.inc("yfinance", "error")
+                continue
+            finally:
+                dt = time.perf_counter() - t0
+                metrics.PROVIDER_SECONDS.observe(dt, "yfinance")
+                metrics.record_timing("fetch_yfinance", dt)
+            for t, bars in got.items():
+                _store_bars(provider, source, t, bars, win_ns)
+                missing.discard(t)
+            errors += [f"yfinance: no {source} rows for {t}" for t in group if t not in got]
+            metrics.PROVIDER_REQUESTS.inc("yfinance", "ok" if len(got) == len(group) else "partial" if got else "empty")
+    elif windows and provider != "mock":
+        errors.append(f"{provider}: no intraday bars")
+
+    if not missing:
+        frames = {}
+        for t in tks:
+            bars, _ = load_bars(provider, source, t, start_ns)
+            if len(bars):
+                frames[t] = resample_ohlc(bars, interval)
+        if len(frames) == len(tks):
+            return frames
+
+    if allow_mock:
+        if provider != "mock":
+            metrics.PROVIDER_FALLBACKS.inc(provider, "mock", amount=len(tks))
+        frames = {t: resample_ohlc(_mock_bars(t, start_ns, source), interval) for t in tks}
+        for f in frames.values():
+            f.attrs["mock"] = True
+        return frames
+    raise ValueError("Price fetch failed. " + " | ".join(errors or [f"no {interval} bars"]))
+
+def close_frame(provider: str, tks: List[str], period: str, interval: str, start_ns: int,
+                max_age: Optional[float] = None, allow_mock: bool = True) -> pd.DataFrame:
+    frames = load_bar_frames(provider, tks, period, interval, start_ns, max_age, allow_mock)
+    df = pd.DataFrame({t: f["close"] for t, f in frames.items()}).sort_index().dropna(how="all")
+    df.attrs["mock"] = any(f.attrs.get("mock") for f in frames.values())
+    return df
+
+def get_bars(ticker: str, period: str = "5d", interval: str = "5m") -> pd.DataFrame:
+    provider = (os.getenv("PRICE_PROVIDER", "auto") or "auto").strip().lower()
+    allow_mock = (os.getenv("ALLOW_MOCK_DATA", "1") == "1")
+    start = datetime.now(timezone.utc) - timedelta(days=_period_to_days(period))
+    start_ns = int(pd.Timestamp(start).as_unit("ns").value)
+    with metrics.stage("prices"):
+        return load_bar_frames(provider, [ticker.upper()], period, interval, start_ns, allow_mock=allow_mock)[ticker.upper()]
@@ -0,0 +1,166 @@
+from __future__ import annotations
+import os
+import time
+import inspect
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import lazy, metrics
+from .data import _period_to_days, normalize_interval, preload, preloaded
+
+# Batch analysis (/api/batch).
+#
+# A dashboard page fires many small analyses over overlapping tickers. A
+# batch validates every sub-request up front, loads prices once per interval
+# for the union of their tickers over the longest period they need, then
+# runs the sub-requests concurrently (BATCH_WORKERS threads) with those
+# frames preloaded, so each get_price_df call inside them is a slice. A
+# failing sub-request only fills its own slot; sub-requests whose tickers
+# are not in the shared frame (see data.preload) load their prices as they
+# would standalone.
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+
+PriceSpec = Tuple[List[str], str, str]  # tickers, period, interval
+
+@dataclass(frozen=True)
+class _Op:
+    module: str
+    func: str
+    prices: Callable[[dict], Optional[PriceSpec]]  # bound arguments -> prices the call will load
+
+OPS: Dict[str, _Op] = {
+    "pairs": _Op("pairs", "pairs_analyze", lambda a: ([a["ticker1"], a["ticker2"]], a["period"], a["interval"])),
+    "volatility": _Op("volatility", "volatility_forecast", lambda a: ([a["ticker"]], a["period"], a["interval"])),
+    "ml": _Op("ml", "ml_predict", lambda a: ([a["ticker"]], lazy.load("ml").price_period(a["train_years"]), "1d")),
+    "portfolio": _Op("portfolio", "optimize_portfolio", lambda a: (list(a["tickers"]), a["period"], "1d")),
+    "options": _Op("options", "option_price", lambda a: None),
+}
+
+# JSON types differ from what the analytics expect; coerce before anything
+# (grouping, period parsing) touches the values
+_INT_PARAMS = ("window", "train_years", "horizon_days", "max_points")
+_FLOAT_PARAMS = ("kalman_delta", "kalman_obs_var", "risk_free_rate", "S", "K", "T", "r", "sigma")
+_STR_PARAMS = ("period", "model", "model_name", "hedge", "points_format")
+
+def _coerce(params: dict) -> dict:
+    out = dict(params)
+    for k, v in params.items():
+        if k in _INT_PARAMS and not (k == "max_points" and v is None):
+            if isinstance(v, bool) or not isinstance(v, (int, float, str)) or float(v) != int(float(v)):
+                raise ValueError(f"{k} must be an integer")
+            out[k] = int(float(v))
+        elif k in _FLOAT_PARAMS:
+            if isinstance(v, bool) or not isinstance(v, (int, float, str)):
+                raise ValueError(f"{k} must be a number")
+            out[k] = float(v)
+        elif k in _STR_PARAMS and not isinstance(v, str):
+            raise ValueError(f"{k} must be a string")
+    return out
+
+@dataclass
+class _Planned:
+    id: str
+    type: str
+    fn: Callable
+    params: dict
+    prices: Optional[PriceSpec]
+
+def _prepare(rid: str, kind: str, params: dict) -> _Planned:
+    op = OPS.get(kind)
+    if op is None:
+        raise ValueError(f"Unknown request type '{kind}'. Use one of: {', '.join(OPS)}")
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object")
+    params = _coerce(params)
+    for k in ("ticker", "ticker1", "ticker2"):
+        if k in params:
+            params[k] = str(params[k]).strip().upper()
+    if "tickers" in params:
+        if not isinstance(params["tickers"], list):
+            raise ValueError("tickers must be a list")
+        params["tickers"] = [str(t).strip().upper() for t in params["tickers"] if str(t).strip()]
+        if len(params["tickers"]) < 2:
+            raise ValueError("Provide at least 2 tickers")
+    if "interval" in params:
+        params["interval"] = normalize_interval(params["interval"])
+    if params.get("points_format") == "binary":
+        raise ValueError("Batch results are JSON; use points_format 'records' or 'columnar'")
+
+    fn = getattr(lazy.load(op.module), op.func)
+    try:
+        bound = inspect.signature(fn).bind(**params)
+    except TypeError as e:
+        raise ValueError(f"Invalid params for '{kind}': {e}")
+    bound.apply_defaults()
+    return _Planned(rid, kind, fn, params, op.prices(bound.arguments))
+
+def _run(p: _Planned) -> dict:
+    t0 = time.perf_counter()
+    try:
+        out = {"type": p.type, "status": 200, "result": p.fn(**p.params)}
+    except ValueError as e:
+        out = {"type": p.type, "status": 400, "error": str(e)}
+    except Exception as e:
+        out = {"type": p.type, "status": 500, "error": f"{type(e).__name__}: {e}"}
+    out["seconds"] = round(time.perf_counter() - t0, 4)
+    return out
+
+def run_batch(requests: List[dict]) -> dict:
+    t0 = time.perf_counter()
+    if not requests:
+        raise ValueError("No requests provided")
+    if len(requests) > BATCH_MAX_REQUESTS:
+        raise ValueError(f"At most {BATCH_MAX_REQUESTS} requests per batch")
+    ids = [str(r.get("id") or i) for i, r in enumerate(requests)]
+    dupes = sorted({i for i in ids if ids.count(i) > 1})
+    if dupes:
+        raise ValueError(f"Duplicate request ids: {', '.join(dupes)}")
+
+    results: Dict[str, dict] = {}
+    planned: List[_Planned] = []
+    for rid, r in zip(ids, requests):
+        try:
+            planned.append(_prepare(rid, r.get("type", ""), r.get("params") or {}))
+        except Exception as e:  # any malformed sub-request only fails its own slot
+            error = str(e) if isinstance(e, ValueError) else f"Invalid params: {type(e).__name__}: {e}"
+            results[rid] = {"type": r.get("type"), "status": 400, "error": error, "seconds": 0.0}
+
+    # one load per interval: union of tickers, longest period
+    groups: Dict[str, Tuple[List[str], str]] = {}
+    for p in planned:
+        if p.prices is None:
+            continue
+        tks, period, interval = p.prices
+        union, longest = groups.get(interval, ([], period))
+        if _period_to_days(period) > _period_to_days(longest):
+            longest = period
+        groups[interval] = (list(dict.fromkeys(union + tks)), longest)
+
+    frames, loads = {}, {}
+    t1 = time.perf_counter()
+    with metrics.stage("batch_prices"):
+        for interval, (tks, period) in groups.items():
+            try:
+                shared = preload(tks, period, interval)
+            except ValueError:
+                shared = None
+            if shared is not None:
+                frames[interval] = shared
+            loads[interval] = {"tickers": len(tks), "period": period,
+                               "shared": len(shared[0].columns) if shared is not None else 0}
+    load_seconds = time.perf_counter() - t1
+
+    # each task runs in its own copy of the context that holds the preloaded frames
+    with preloaded(frames), ThreadPoolExecutor(max_workers=max(1, min(BATCH_WORKERS, len(planned)))) as pool:
+        futures = [(p.id, pool.submit(contextvars.copy_context().run, _run, p)) for p in planned]
+        for rid, fut in futures:
+            results[rid] = fut.result()
+
+    return {
+        "results": {rid: results[rid] for rid in ids},
+        "prices": {"seconds": round(load_seconds, 4), "loads": loads},
+        "seconds": round(time.perf_counter() - t0, 4),
+    }
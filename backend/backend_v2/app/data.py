@@ -1,14 +1,27 @@
 import os
 import io
-import time
+import math
+import asyncio
+import re
+import json
 import hashlib
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 import requests
-import yfinance as yf
+import requests.adapters
+
+from .cache import TTLCache, sizeof
+from . import metrics
+from . import local_store
 
 PERIOD_TO_DAYS = {
     "5d": 7,
@@ -35,39 +48,124 @@ def _period_to_days(period: str) -> int:
         return int(p[:-1]) * 365 + 15
     return PERIOD_TO_DAYS["2y"]
 
-def _cache_path(provider: str, tickers: List[str], period: str, interval: str) -> str:
-    key = f"{provider}|{','.join(sorted([t.upper() for t in tickers]))}|{period}|{interval}"
-    h = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
-    return os.path.join(".cache", f"prices_{h}.csv.gz")
+# Bar intervals. Daily bars go through the per-ticker store below; intraday
+# ones through the chunked OHLCV store in bars.py, which resamples them from
+# a finer stored interval. Annualization uses a 252-day year of 6.5h sessions.
+INTERVAL_SECONDS = {"1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "4h": 14400, "1d": 86400}
+_INTERVAL_ALIASES = {"60m": "1h", "240m": "4h", "1day": "1d"}
+SESSION_SECONDS = 6.5 * 3600
+
+def normalize_interval(interval: Optional[str]) -> str:
+    i = (interval or "1d").strip().lower()
+    i = _INTERVAL_ALIASES.get(i, i)
+    if i not in INTERVAL_SECONDS:
+        raise ValueError(f"Unknown interval '{interval}'. Use one of: {', '.join(INTERVAL_SECONDS)}")
+    return i
+
+def bars_per_year(interval: str = "1d") -> float:
+    i = normalize_interval(interval)
+    if i == "1d":
+        return 252.0
+    return 252.0 * math.ceil(SESSION_SECONDS / INTERVAL_SECONDS[i])
+
+def date_labels(index: pd.DatetimeIndex, interval: str = "1d") -> pd.Index:
+    return index.strftime("%Y-%m-%d" if normalize_interval(interval) == "1d" else "%Y-%m-%dT%H:%M:%SZ")
 
-def _read_cache(path: str, ttl_seconds: int = 6 * 3600) -> Optional[pd.DataFrame]:
+# ---- per-ticker price store ----
+# One memory-mapped .npy of (UTC ns date, close) records per
+# provider/interval/ticker, plus a small JSON sidecar recording how far back
+# the series has been fetched and when it was last refreshed. Dates and
+# closes share one file so a single os.replace publishes both, and merges
+# are serialized by _write_lock so concurrent refreshes cannot drop bars. Any ticker set
+# and period is assembled from these, so [AAPL, MSFT] and [MSFT, AAPL, GOOG]
+# share storage, and only missing leading/trailing ranges hit the providers.
+STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join(".cache", "store"))
+STORE_TTL_SECONDS = int(os.getenv("PRICE_STORE_TTL", str(6 * 3600)))
+INTRADAY_TTL_SECONDS = int(os.getenv("PRICE_INTRADAY_TTL", "300"))
+_SERIES_DTYPE = np.dtype([("date", "<i8"), ("close", "<f8")])
+_write_lock = threading.Lock()
+
+def _store_ttl(interval: str) -> float:
+    return STORE_TTL_SECONDS if interval == "1d" else INTRADAY_TTL_SECONDS
+
+def _store_base(provider: str, interval: str, ticker: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9._^=-]", "_", ticker.upper())
+    return os.path.join(STORE_DIR, provider, interval, safe)
+
+def _load_series(provider: str, interval: str, ticker: str) -> Optional[Tuple[np.ndarray, np.ndarray, dict]]:
+    base = _store_base(provider, interval, ticker)
     try:
-        st = os.stat(path)
-        if time.time() - st.st_mtime > ttl_seconds:
-            return None
-        df = pd.read_csv(path, compression="gzip", parse_dates=["Date"])
-        df = df.set_index("Date")
-        df.index = pd.to_datetime(df.index, utc=True)
-        df = df.sort_index()
-        return df
-    except Exception:
+        with open(base + ".json", "r") as f:
+            meta = json.load(f)
+        series = np.load(base + ".series.npy", mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if series.dtype != _SERIES_DTYPE:
         return None
+    return series["date"], series["close"], meta
 
-def _write_cache(path: str, df: pd.DataFrame) -> None:
-    try:
-        out = df.copy()
-        out.index = pd.to_datetime(out.index, utc=True)
-        out = out.sort_index()
-        out.reset_index().rename(columns={"index": "Date"}).to_csv(path, index=False, compression="gzip")
-    except Exception:
-        pass
+def _atomic_save(path: str, arr: np.ndarray) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+def _store_series(provider: str, interval: str, ticker: str, s: pd.Series, fetched_from: int) -> None:
+    s = s.dropna()
+    new_dates = pd.DatetimeIndex(s.index).as_unit("ns").asi8
+    new_close = s.to_numpy(dtype=np.float64)
+    base = _store_base(provider, interval, ticker)
+
+    with _write_lock:
+        old = _load_series(provider, interval, ticker)
+        covered_from = fetched_from
+        if old is not None:
+            old_dates, old_close, meta = old
+            covered_from = min(covered_from, int(meta.get("covered_from", fetched_from)))
+            # new rows win: the last stored bar may have been a partial session
+            keep = ~np.isin(old_dates, new_dates)
+            new_dates = np.concatenate([np.asarray(old_dates)[keep], new_dates])
+            new_close = np.concatenate([np.asarray(old_close)[keep], new_close])
+            order = np.argsort(new_dates, kind="stable")
+            new_dates, new_close = new_dates[order], new_close[order]
+
+        series = np.empty(len(new_dates), dtype=_SERIES_DTYPE)
+        series["date"], series["close"] = new_dates, new_close
+        try:
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            _atomic_save(base + ".series.npy", series)
+            meta = {"covered_from": int(covered_from), "updated_at": time.time()}
+            tmp = f"{base}.json.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, base + ".json")
+        except OSError:
+            pass
+
+def _store_frame(provider: str, interval: str, tickers: List[str], start_ns: int) -> pd.DataFrame:
+    cols = {}
+    for t in tickers:
+        loaded = _load_series(provider, interval, t)
+        if loaded is None:
+            continue
+        dates, close, _ = loaded
+        i = int(np.searchsorted(dates, start_ns, side="left"))
+        if i >= len(dates):
+            continue
+        idx = pd.to_datetime(np.asarray(dates[i:]), utc=True)
+        cols[t] = pd.Series(np.asarray(close[i:], dtype=float), index=idx)
+    if not cols:
+        return pd.DataFrame()
+    df = pd.DataFrame(cols).sort_index()
+    return df.dropna(how="all")
 
-def _fetch_yfinance(tickers: List[str], period: str, interval: str) -> pd.DataFrame:
+def _fetch_yfinance(tickers: List[str], start: datetime, interval: str) -> pd.DataFrame:
     # yfinance sometimes gets blocked; we keep it best-effort.
+    import yfinance as yf  # deferred: heavy import, and not needed for store hits
     tks = [t.upper() for t in tickers]
     df = yf.download(
         tickers=tks,
-        period=period,
+        start=start.strftime("%Y-%m-%d"),
         interval=interval,
         group_by="column",
         auto_adjust=False,
@@ -109,22 +207,62 @@ def _stooq_symbol(ticker: str) -> str:
     # Default to US listings for typical tickers/ETFs
     return f"{t}.us"
 
-def _fetch_stooq_one(ticker: str, start_date: datetime) -> pd.Series:
-    sym = _stooq_symbol(ticker)
-    url = f"https://stooq.com/q/d/l/?s={sym}&i=d"
-    r = requests.get(url, timeout=20)
+# ---- Stooq ----
+# One pooled session shared by all worker threads; requests run in parallel up
+# to STOOQ_CONCURRENCY, and transient failures (network errors, 429/5xx) are
+# retried per ticker with exponential backoff.
+STOOQ_BASE_URL = os.getenv("STOOQ_BASE_URL", "https://stooq.com")
+STOOQ_CONCURRENCY = int(os.getenv("STOOQ_CONCURRENCY", "8"))
+STOOQ_TIMEOUT = float(os.getenv("STOOQ_TIMEOUT", "20"))
+STOOQ_RETRIES = int(os.getenv("STOOQ_RETRIES", "2"))
+STOOQ_BACKOFF = float(os.getenv("STOOQ_BACKOFF", "0.5"))
+
+_stooq_session: Optional[requests.Session] = None
+_stooq_session_lock = threading.Lock()
+
+class _StooqTransientError(ValueError):
+    pass
+
+def _get_stooq_session() -> requests.Session:
+    global _stooq_session
+    with _stooq_session_lock:
+        if _stooq_session is None:
+            sess = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, STOOQ_CONCURRENCY))
+            sess.mount("http://", adapter)
+            sess.mount("https://", adapter)
+            _stooq_session = sess
+        return _stooq_session
+
+def _fetch_stooq_one(ticker: str, start_date: datetime, session: Optional[requests.Session] = None) -> pd.Series:
+    sess = session or _get_stooq_session()
+    start_ts = pd.Timestamp(start_date)
+    start_ts = start_ts.tz_localize("UTC") if start_ts.tzinfo is None else start_ts.tz_convert("UTC")
+    # d1/d2 make Stooq return only the requested range instead of the full history
+    params = {
+        "s": _stooq_symbol(ticker),
+        "i": "d",
+        "d1": start_ts.strftime("%Y%m%d"),
+        "d2": datetime.now(timezone.utc).strftime("%Y%m%d"),
+    }
+    try:
+        r = sess.get(f"{STOOQ_BASE_URL.rstrip('/')}/q/d/l/", params=params, timeout=STOOQ_TIMEOUT)
+    except requests.RequestException as e:
+        raise _StooqTransientError(f"Stooq request failed for {ticker}: {e}")
+    if r.status_code == 429 or r.status_code >= 500:
+        raise _StooqTransientError(f"Stooq HTTP {r.status_code} for {ticker}")
     if r.status_code != 200:
         raise ValueError(f"Stooq HTTP {r.status_code} for {ticker}")
     text = r.text.strip()
     if not text or "Date,Open,High,Low,Close" not in text:
         raise ValueError(f"Stooq returned unexpected body for {ticker}")
-    df = pd.read_csv(io.StringIO(text))
-    if df.empty or "Date" not in df.columns or "Close" not in df.columns:
+    df = pd.read_csv(io.StringIO(text), usecols=["Date", "Close"])
+    if df.empty:
         raise ValueError(f"Stooq missing columns for {ticker}")
 
     df["Date"] = pd.to_datetime(df["Date"], utc=True, errors="coerce")
     df = df.dropna(subset=["Date"])
-    df = df[df["Date"] >= pd.Timestamp(start_date, tz="UTC")]
+    df = df[df["Date"] >= start_ts]
     df = df.sort_values("Date")
     s = pd.to_numeric(df["Close"], errors="coerce")
     s.index = df["Date"]
@@ -134,17 +272,39 @@ def _fetch_stooq_one(ticker: str, start_date: datetime) -> pd.Series:
         raise ValueError(f"Stooq returned no rows in range for {ticker}")
     return s
 
-def _fetch_stooq(tickers: List[str], period: str) -> pd.DataFrame:
-    days = _period_to_days(period)
-    start = datetime.now(timezone.utc) - timedelta(days=days)
-    series = []
-    for t in tickers:
-        series.append(_fetch_stooq_one(t, start))
-    df = pd.concat(series, axis=1).sort_index()
+def _fetch_stooq_retrying(ticker: str, start: datetime, session: requests.Session) -> pd.Series:
+    for attempt in range(max(0, STOOQ_RETRIES)):
+        try:
+            return _fetch_stooq_one(ticker, start, session=session)
+        except _StooqTransientError:
+            time.sleep(STOOQ_BACKOFF * (2 ** attempt))
+    # last attempt: a transient error here reaches the caller as a ValueError
+    return _fetch_stooq_one(ticker, start, session=session)
+
+def _fetch_stooq(tickers: List[str], start: datetime) -> pd.DataFrame:
+    # Partial results are returned for the tickers that succeeded; per-ticker
+    # failures are reported in df.attrs["errors"]. Raises only if all failed.
+    sess = _get_stooq_session()
+    results: Dict[str, pd.Series] = {}
+    failures: Dict[str, str] = {}
+    workers = max(1, min(STOOQ_CONCURRENCY, len(tickers)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futs = {pool.submit(_fetch_stooq_retrying, t, start, sess): t for t in tickers}
+        for fut in as_completed(futs):
+            try:
+                results[futs[fut]] = fut.result()
+            except Exception as e:
+                failures[futs[fut].upper()] = str(e)
+
+    if not results:
+        raise ValueError("No usable prices from Stooq: " + "; ".join(failures.values()))
+    df = pd.concat([results[t] for t in tickers if t in results], axis=1).sort_index()
     df = df.dropna(how="all")
     if df.empty:
         raise ValueError("No usable prices from Stooq")
-    return df.astype(float)
+    df = df.astype(float)
+    df.attrs["errors"] = failures
+    return df
 
 def _mock_prices(tickers: List[str], period: str) -> pd.DataFrame:
     days = _period_to_days(period)
@@ -156,43 +316,305 @@ def _mock_prices(tickers: List[str], period: str) -> pd.DataFrame:
         rets = rng.normal(loc=0.0003, scale=0.02, size=len(idx))
         prices = 100 * np.exp(np.cumsum(rets))
         out[t.upper()] = prices
+    out.attrs["mock"] = True
     return out
 
+def _fetch_into_store(provider: str, interval: str, tickers: List[str], start: datetime, errors: List[str]) -> List[str]:
+    # Walk the provider chain for one fetch window; returns the tickers that
+    # were stored. Tickers a provider could not serve fall through to the next.
+    chain = []
+    if provider in ("auto", "yfinance"):
+        chain.append(("yfinance", lambda tks: _fetch_yfinance(tks, start=start, interval=interval)))
+    if provider in ("auto", "stooq"):
+        chain.append(("stooq", lambda tks: _fetch_stooq(tks, start=start)))
+
+    start_ns = int(pd.Timestamp(start).as_unit("ns").value)
+    remaining = list(tickers)
+    for i, (name, fetch) in enumerate(chain):
+        if not remaining:
+            break
+        if i > 0:
+            metrics.PROVIDER_FALLBACKS.inc(chain[i - 1][0], name, amount=len(remaining))
+        t0 = time.perf_counter()
+        try:
+            df = fetch(remaining)
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+            metrics.PROVIDER_REQUESTS.inc(name, "error")
+            continue
+        finally:
+            dt = time.perf_counter() - t0
+            metrics.PROVIDER_SECONDS.observe(dt, name)
+            metrics.record_timing(f"fetch_{name}", dt)
+        got = [t for t in remaining if t in df.columns and df[t].notna().any()]
+        for t in got:
+            _store_series(provider, interval, t, df[t], start_ns)
+        failed = df.attrs.get("errors", {})
+        for t in remaining:
+            if t not in got:
+                errors.append(f"{name}: {failed.get(t, f'no rows for {t}')}")
+        metrics.PROVIDER_REQUESTS.inc(name, "ok" if len(got) == len(remaining) else "partial" if got else "empty")
+        remaining = [t for t in remaining if t not in got]
+    return [t for t in tickers if t not in remaining]
+
+# In-process frame cache in front of the store, with stale-while-revalidate.
+# A frame is fresh for the store TTL; after that it is still served (up to
+# PRICE_STALE_SECONDS old) while one background revalidation per key
+# refreshes it, so only cold or over-stale keys load inline. Concurrent
+# identical misses share one provider fetch.
+#
+# Ticker sets requested within PRICE_HOT_SECONDS are tracked, and the refresh
+# scheduler re-fetches them PRICE_REFRESH_AHEAD seconds before they go stale;
+# PRICE_PREWARM_UNIVERSE is loaded at startup and kept hot permanently. The
+# store is per ticker, so refreshing a universe also serves every subset.
+PRICE_STALE_SECONDS = float(os.getenv("PRICE_STALE_SECONDS", str(24 * 3600)))
+PRICE_REFRESH_AHEAD = float(os.getenv("PRICE_REFRESH_AHEAD", "900"))
+PRICE_REFRESH_INTERVAL = float(os.getenv("PRICE_REFRESH_INTERVAL", "60"))
+PRICE_HOT_SECONDS = float(os.getenv("PRICE_HOT_SECONDS", "3600"))
+PRICE_PREWARM_UNIVERSE = [t.strip().upper() for t in os.getenv("PRICE_PREWARM_UNIVERSE", "").split(",") if t.strip()]
+PRICE_PREWARM_PERIOD = os.getenv("PRICE_PREWARM_PERIOD", "2y")
+
+@dataclass
+class _Frame:
+    df: pd.DataFrame
+    loaded_at: float
+
+PRICE_CACHE = TTLCache(
+    max_bytes=int(float(os.getenv("PRICE_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    ttl_seconds=max(PRICE_STALE_SECONDS, STORE_TTL_SECONDS),
+    sizer=lambda e: sizeof(e.df),
+)
+_refresh_pool = ThreadPoolExecutor(max_workers=int(os.getenv("PRICE_REFRESH_WORKERS", "2")), thread_name_prefix="price-refresh")
+_hot_lock = threading.Lock()
+_hot: Dict[tuple, float] = {}      # (provider, tickers, period, interval) -> last request time
+_pinned: set = set()               # hot specs that never age out (prewarmed universe)
+_revalidating: set = set()
+_swr_stats = {"stale_served": 0, "revalidations": 0, "revalidation_errors": 0, "scheduled_refreshes": 0}
+
+def _count(stat: str, n: int = 1) -> None:
+    # request threads and the refresh pool both bump these
+    with _hot_lock:
+        _swr_stats[stat] += n
+
+def price_version(df: pd.DataFrame) -> str:
+    # Content token for a price frame; changes whenever any bar is added or revised.
+    h = hashlib.sha1()
+    h.update(",".join(map(str, df.columns)).encode("utf-8"))
+    h.update(np.ascontiguousarray(pd.DatetimeIndex(df.index).as_unit("ns").asi8).tobytes())
+    h.update(np.ascontiguousarray(df.to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()[:16]
+
+def price_cache_stats() -> dict:
+    with _hot_lock:
+        hot = len(_hot)
+        revalidating = len(_revalidating)
+        swr = dict(_swr_stats)
+    return {**PRICE_CACHE.stats(), **swr, "hot_sets": hot, "revalidating": revalidating}
+
+def _window_start(period: str) -> datetime:
+    # Day-aligned start so every request on a given day maps to the same window
+    days = _period_to_days(period)
+    return (datetime.now(timezone.utc) - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _cache_key(provider: str, tks: Tuple[str, ...], start: datetime, interval: str) -> tuple:
+    # a re-imported local dataset gets a new version, so its frames never mix with the old one
+    version = local_store.current_version() if provider == "local" else None
+    return (provider, tks, start.date().isoformat(), interval, version)
+
 def get_price_df(tickers: List[str], period: str = "2y", interval: str = "1d") -> pd.DataFrame:
     if not tickers:
         raise ValueError("No tickers provided")
 
     provider = (os.getenv("PRICE_PROVIDER", "auto") or "auto").strip().lower()
-    allow_mock = (os.getenv("ALLOW_MOCK_DATA", "1") == "1")
+    interval = normalize_interval(interval)
+    tks = list(dict.fromkeys(t.upper() for t in tickers))
+    sorted_tks = tuple(sorted(tks))
+    start = _window_start(period)
 
-    # Cache (provider-agnostic key to avoid refetch spam)
-    cache_key_provider = provider if provider != "auto" else "auto"
-    cache_path = _cache_path(cache_key_provider, tickers, period, interval)
-    cached = _read_cache(cache_path)
-    if cached is not None and not cached.empty:
-        return cached
+    shared = _preloaded.get()
+    if shared is not None and interval in shared:
+        df, shared_start = shared[interval]
+        if start >= shared_start and all(t in df.columns for t in tks):
+            return df.loc[df.index >= pd.Timestamp(start), tks].dropna(how="all")
 
-    errors = []
+    key = _cache_key(provider, sorted_tks, start, interval)
+    with _hot_lock:
+        _hot[(provider, sorted_tks, period, interval)] = time.time()
+    with metrics.stage("prices"):
+        entry = PRICE_CACHE.get_or_load(key, lambda: _Frame(_load_price_df(provider, list(sorted_tks), period, interval, start), time.time()))
+    if time.time() - entry.loaded_at > _store_ttl(interval):
+        _count("stale_served")
+        _revalidate(provider, sorted_tks, period, interval)
+    # Column selection hands back a fresh frame, so callers cannot mutate the cached one
+    df = entry.df
+    return df[[t for t in tks if t in df.columns]]
 
-    if provider in ("auto", "yfinance"):
+# Batch requests load the union of their tickers once and run every
+# sub-request inside `preloaded()`: get_price_df then answers any subset of
+# those tickers over a window inside the loaded one by slicing that frame,
+# the same rows a separate load would produce from the per-ticker store.
+_preloaded: ContextVar[Optional[Dict[str, Tuple[pd.DataFrame, datetime]]]] = ContextVar("preloaded_prices", default=None)
+
+def preload(tickers: List[str], period: str, interval: str = "1d") -> Optional[Tuple[pd.DataFrame, datetime]]:
+    # A union that fails as a whole (one unknown ticker is enough) or only
+    # comes back as the mock fallback is not shared as is; for daily bars the
+    # tickers that attempt did store are shared instead, and the rest load
+    # (and fail) in their own sub-requests. None when nothing can be shared.
+    provider = (os.getenv("PRICE_PROVIDER", "auto") or "auto").strip().lower()
+    start = _window_start(period)
+    try:
+        df = get_price_df(tickers, period=period, interval=interval)
+        if not df.attrs.get("mock") or provider == "mock":
+            return df, start
+    except ValueError:
+        pass
+    if normalize_interval(interval) != "1d" or provider in ("mock", "local"):
+        return None
+    df = _store_frame(provider, "1d", [t.upper() for t in tickers], int(pd.Timestamp(start).as_unit("ns").value))
+    return (df, start) if not df.empty else None
+
+@contextmanager
+def preloaded(frames: Dict[str, Tuple[pd.DataFrame, datetime]]):
+    token = _preloaded.set(frames)
+    try:
+        yield
+    finally:
+        _preloaded.reset(token)
+
+def _revalidate(provider: str, tks: Tuple[str, ...], period: str, interval: str, max_age: Optional[float] = None) -> bool:
+    # Reload one cache key in the background; returns False if already in flight.
+    start = _window_start(period)
+    key = _cache_key(provider, tks, start, interval)
+    with _hot_lock:
+        if key in _revalidating:
+            return False
+        _revalidating.add(key)
+
+    def run():
         try:
-            df = _fetch_yfinance(tickers, period=period, interval=interval)
-            _write_cache(cache_path, df)
-            return df
-        except Exception as e:
-            errors.append(f"yfinance: {e}")
+            df = _load_price_df(provider, list(tks), period, interval, start, max_age=max_age)
+            PRICE_CACHE.set(key, _Frame(df, time.time()))
+            _count("revalidations")
+        except Exception:
+            _count("revalidation_errors")  # keep serving the stale frame
+        finally:
+            with _hot_lock:
+                _revalidating.discard(key)
 
-    if provider in ("auto", "stooq"):
+    _refresh_pool.submit(run)
+    return True
+
+def refresh_hot() -> int:
+    # One scheduler pass: refresh hot ticker sets that are missing from the
+    # cache or within PRICE_REFRESH_AHEAD (at most half the TTL, for short
+    # intraday TTLs) of going stale. Returns refreshes started.
+    now = time.time()
+    with _hot_lock:
+        for spec in [s for s, t in _hot.items() if now - t > PRICE_HOT_SECONDS and s not in _pinned]:
+            del _hot[spec]
+        specs = list(_hot)
+    started = 0
+    for provider, tks, period, interval in specs:
+        refresh_after = max(0.0, _store_ttl(interval) - min(PRICE_REFRESH_AHEAD, _store_ttl(interval) / 2))
+        entry = PRICE_CACHE.peek(_cache_key(provider, tks, _window_start(period), interval))
+        if entry is None or now - entry.loaded_at >= refresh_after:
+            if _revalidate(provider, tks, period, interval, max_age=refresh_after):
+                started += 1
+    _count("scheduled_refreshes", started)
+    return started
+
+def prewarm_universe() -> None:
+    if not PRICE_PREWARM_UNIVERSE:
+        return
+    provider = (os.getenv("PRICE_PROVIDER", "auto") or "auto").strip().lower()
+    spec = (provider, tuple(sorted(PRICE_PREWARM_UNIVERSE)), PRICE_PREWARM_PERIOD, "1d")
+    with _hot_lock:
+        _pinned.add(spec)
+    get_price_df(PRICE_PREWARM_UNIVERSE, period=PRICE_PREWARM_PERIOD)
+
+async def run_refresh_scheduler() -> None:
+    try:
+        await asyncio.to_thread(prewarm_universe)
+    except Exception:
+        pass  # the scheduler retries the universe like any other hot set
+    while True:
+        await asyncio.sleep(PRICE_REFRESH_INTERVAL)
         try:
-            df = _fetch_stooq(tickers, period=period)
-            _write_cache(cache_path, df)
+            await asyncio.to_thread(refresh_hot)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            continue
+
+def _load_price_df(provider: str, tks: List[str], period: str, interval: str, start: datetime,
+                   max_age: Optional[float] = None) -> pd.DataFrame:
+    # max_age: stored series older than this are re-fetched (default: the store TTL)
+    max_age = _store_ttl(interval) if max_age is None else max_age
+    allow_mock = (os.getenv("ALLOW_MOCK_DATA", "1") == "1")
+    start_ns = int(pd.Timestamp(start).as_unit("ns").value)
+    if provider == "local":
+        return _load_local_df(tks, period, interval, start_ns, allow_mock)
+    if interval != "1d":
+        from .bars import close_frame  # deferred: bars builds on this module
+        return close_frame(provider, tks, period, interval, start_ns, max_age, allow_mock)
+
+    # Plan fetches: missing/short history is fetched from `start`, stale
+    # series only from their last stored bar (re-fetched in case it was partial).
+    windows: Dict[int, List[str]] = {}
+    missing = set()
+    now = time.time()
+    for t in tks:
+        loaded = _load_series(provider, interval, t)
+        if loaded is None or len(loaded[0]) == 0:
+            windows.setdefault(start_ns, []).append(t)
+            missing.add(t)
+        elif int(loaded[2].get("covered_from", start_ns)) > start_ns:
+            windows.setdefault(start_ns, []).append(t)
+        elif now - float(loaded[2].get("updated_at", 0)) > max_age:
+            windows.setdefault(int(loaded[0][-1]), []).append(t)
+
+    errors = []
+    for win_ns, group in sorted(windows.items()):
+        win = pd.Timestamp(win_ns, tz="UTC").to_pydatetime()
+        stored = _fetch_into_store(provider, interval, group, win, errors)
+        missing.difference_update(stored)
+        stale = [t for t in group if t not in stored and t not in missing]
+        if stale:
+            metrics.PROVIDER_FALLBACKS.inc(provider, "stale_store", amount=len(stale))
+
+    # Stale tickers whose refresh failed are still served from the store;
+    # only tickers with no usable history at all force the fallback.
+    if not missing:
+        df = _store_frame(provider, interval, tks, start_ns)
+        if not df.empty:
             return df
-        except Exception as e:
-            errors.append(f"stooq: {e}")
 
     if allow_mock:
-        df = _mock_prices(tickers, period=period)
-        _write_cache(cache_path, df)
-        return df
+        if provider != "mock":
+            metrics.PROVIDER_FALLBACKS.inc(provider, "mock", amount=len(tks))
+        return _mock_prices(tks, period=period)
 
     raise ValueError("Price fetch failed. " + " | ".join(errors))
+
+def _load_local_df(tks: List[str], period: str, interval: str, start_ns: int, allow_mock: bool) -> pd.DataFrame:
+    # The local dataset is already a columnar store, so it is sliced directly
+    # instead of being copied into the per-ticker store. Same fallback rule as
+    # the network providers: any ticker without history forces the mock frame.
+    t0 = time.perf_counter()
+    try:
+        df = local_store.local_prices(tks, start_ns, interval)
+    except (ValueError, OSError) as e:
+        metrics.PROVIDER_REQUESTS.inc("local", "error")
+        error = str(e)
+    else:
+        metrics.PROVIDER_SECONDS.observe(time.perf_counter() - t0, "local")
+        missing = [t for t in tks if t not in df.columns or df[t].isna().all()]
+        metrics.PROVIDER_REQUESTS.inc("local", "ok" if not missing else "partial" if len(missing) < len(tks) else "empty")
+        if not missing:
+            return df
+        error = f"local: no history for {', '.join(missing)}"
+
+    if allow_mock:
+        metrics.PROVIDER_FALLBACKS.inc("local", "mock", amount=len(tks))
+        return _mock_prices(tks, period=period)
+    raise ValueError("Price fetch failed. " + error)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import os
+import json
+import math
+import struct
+import inspect
+import asyncio
+import datetime
+import functools
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from fastapi.routing import APIRoute
+
+from . import metrics
+
+try:  # optional fast JSON serializer
+    import orjson
+except ImportError:
+    orjson = None
+
+# Time-series payload formats:
+#   records  - list of per-row dicts (default, unchanged behaviour)
+#   columnar - {"col": [...]} arrays, serialized directly without jsonable_encoder
+#   binary   - application/octet-stream: <u32 header length><JSON header><raw
+#              little-endian column buffers>. The header lists each numeric
+#              column's name/dtype/length in buffer order and inlines
+#              non-numeric columns (e.g. dates); it is space-padded so the
+#              buffers start 8-byte aligned (usable as Float64Array views).
+POINT_FORMATS = ("records", "columnar", "binary")
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+# Point budget: series longer than the client's max_points (capped at
+# POINTS_MAX) are downsampled with Largest-Triangle-Three-Buckets, which
+# keeps the first/last points and, per bucket, the point spanning the
+# largest triangle with its neighbours - peaks and troughs survive where
+# plain striding would drop them.
+POINTS_MAX = int(os.getenv("POINTS_MAX", "5000"))
+
+def points_format(fmt: Optional[str], accept: Optional[str] = None) -> str:
+    if fmt:
+        f = fmt.strip().lower()
+        if f not in POINT_FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'. Use one of: {', '.join(POINT_FORMATS)}")
+        return f
+    if accept and BINARY_MEDIA_TYPE in accept:
+        return "binary"
+    return "records"
+
+def lttb_indices(y: np.ndarray, n: int) -> np.ndarray:
+    # Indices of the n LTTB-selected points of y, with x = position.
+    y = np.asarray(y, dtype=np.float64)
+    N = len(y)
+    if n >= N or n < 3:
+        return np.arange(N) if n >= N else np.unique([0, N - 1])[:max(n, 1)]
+    # n-2 buckets over y[1:N-1]; bucket i is edges[i]:edges[i+1]
+    edges = (np.arange(n - 1) * ((N - 2) / (n - 2))).astype(np.int64) + 1
+    # each bucket's third point is the average of the following bucket (the last point for the last one)
+    cs = np.concatenate([[0.0], np.cumsum(y)])
+    nxt_lo = edges[1:]
+    nxt_hi = np.append(edges[2:], N)
+    cx = (nxt_lo + nxt_hi - 1) / 2.0
+    cy = (cs[nxt_hi] - cs[nxt_lo]) / (nxt_hi - nxt_lo)
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, N - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        xs = np.arange(lo, hi)
+        area = np.abs((a - cx[i]) * (y[lo:hi] - y[a]) - (a - xs) * (cy[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+def downsample(df: pd.DataFrame, max_points: Optional[int] = None, y: Optional[str] = None) -> pd.DataFrame:
+    budget = min(max_points, POINTS_MAX) if max_points else POINTS_MAX
+    if len(df) <= budget:
+        return df
+    col = df[y] if y is not None else df.select_dtypes("number").iloc[:, 0]
+    values = col.astype(float).ffill().bfill().fillna(0.0).to_numpy()
+    return df.iloc[lttb_indices(values, budget)]
+
+def encode_points(df: pd.DataFrame, fmt: str = "records") -> Any:
+    if fmt == "columnar":
+        return {c: df[c].tolist() for c in df.columns}
+    if fmt == "binary":
+        # left as a frame; binary_response() lays out the buffers
+        return df
+    return df.to_dict(orient="records")
+
+def _json_default(obj: Any) -> Any:
+    # numpy values and datetime subclasses (pd.Timestamp) for either serializer
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _finite(obj: Any) -> Any:
+    # NaN/inf -> null, matching orjson; standard JSON has no literal for them
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return _finite(_json_default(obj))
+    return obj
+
+def _dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        body = json.dumps(payload, separators=(",", ":"), allow_nan=False, default=_json_default)
+    except ValueError:  # non-finite floats somewhere; only then pay for the walk
+        body = json.dumps(_finite(payload), separators=(",", ":"), allow_nan=False, default=_json_default)
+    return body.encode("utf-8")
+
+def json_response(payload: Any) -> Response:
+    with metrics.stage("serialize"):
+        body = _dumps(payload)
+    return Response(content=body, media_type="application/json")
+
+def _as_response(out: Any, status_code: int) -> Response:
+    if isinstance(out, Response):
+        return out
+    with metrics.stage("serialize"):
+        body = _dumps(jsonable_encoder(out))
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+def _serialized(endpoint: Callable, status_code: int) -> Callable:
+    if asyncio.iscoroutinefunction(endpoint):
+        async def run(*args, **kwargs):
+            return _as_response(await endpoint(*args, **kwargs), status_code)
+    else:
+        def run(*args, **kwargs):
+            return _as_response(endpoint(*args, **kwargs), status_code)
+    functools.update_wrapper(run, endpoint)
+    # FastAPI reads parameters from this; annotations are resolved against the
+    # endpoint's module, and the return annotation no longer describes `run`
+    run.__signature__ = inspect.signature(endpoint, eval_str=True).replace(return_annotation=inspect.Signature.empty)
+    return run
+
+class SerializingRoute(APIRoute):
+    # Plain return values (the default records responses) are encoded here,
+    # inside stage("serialize"), rather than by FastAPI after the handler
+    # returns, so their cost shows up in Server-Timing and /api/metrics like
+    # the columnar and binary formats. Responses pass through untouched.
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _serialized(endpoint, kwargs.get("status_code") or 200), **kwargs)
+
+def binary_response(payload: dict) -> Response:
+    with metrics.stage("serialize"):
+        return _binary_response(payload)
+
+def _binary_response(payload: dict) -> Response:
+    meta = {k: v for k, v in payload.items() if k != "points"}
+    df = payload.get("points")
+    columns, inline, buffers = [], {}, []
+    if isinstance(df, pd.DataFrame):
+        for c in df.columns:
+            col = df[c]
+            if pd.api.types.is_numeric_dtype(col.dtype) and not pd.api.types.is_bool_dtype(col.dtype):
+                dt = "<i8" if pd.api.types.is_integer_dtype(col.dtype) else "<f8"
+                arr = np.ascontiguousarray(col.to_numpy(dtype=dt))
+                columns.append({"name": c, "dtype": dt, "length": int(arr.size)})
+                buffers.append(arr.tobytes())
+            else:
+                inline[c] = col.tolist()
+    header = _dumps({"meta": meta, "columns": columns, "inline": inline})
+    header += b" " * (-(4 + len(header)) % 8)
+    body = b"".join([struct.pack("<I", len(header)), header, *buffers])
+    return Response(content=body, media_type=BINARY_MEDIA_TYPE)
+
+def render(payload: dict, fmt: str):
+    if fmt == "binary":
+        return binary_response(payload)
+    if fmt == "columnar":
+        return json_response(payload)
+    return payload
@@ -0,0 +1,227 @@
+from __future__ import annotations
+import os
+import re
+import zipfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .cache import TTLCache
+
+# Incremental technical-feature store shared by ml.py and screeners.
+#
+# Features are computed by stepping over bars once, vectorized across all
+# tickers of an aligned close matrix. Each ticker only consumes its own
+# non-NaN bars, so values match computing on that ticker's series alone.
+# The per-ticker recursion state (EMAs, rolling-window ring buffers and
+# sums, last close/return) is persisted next to the feature rows, so when
+# new bars arrive only those bars are stepped. Stored series are rebuilt if
+# a request reaches further back than the stored history or the stored
+# close on the newest overlapping bar no longer matches (e.g. a revision).
+FEATURES = ["ret1", "ret2", "sma5", "sma20", "rsi14", "macd", "macd_signal", "macd_hist"]
+FEATURE_DIR = os.getenv("FEATURE_STORE_DIR", os.path.join(".cache", "features"))
+
+_W_SMA_SHORT, _W_SMA_LONG, _W_RSI = 5, 20, 14
+_A_FAST, _A_SLOW, _A_SIG = 2.0 / (12 + 1), 2.0 / (26 + 1), 2.0 / (9 + 1)
+_STATE_FIELDS = ("count", "last_close", "last_ret1", "ema_fast", "ema_slow", "ema_sig",
+                 "sum5", "sum20", "up_sum", "down_sum", "cbuf", "ubuf", "dbuf")
+
+@dataclass
+class _State:
+    count: np.ndarray       # bars consumed per ticker
+    last_close: np.ndarray
+    last_ret1: np.ndarray
+    ema_fast: np.ndarray
+    ema_slow: np.ndarray
+    ema_sig: np.ndarray
+    sum5: np.ndarray
+    sum20: np.ndarray
+    up_sum: np.ndarray
+    down_sum: np.ndarray
+    cbuf: np.ndarray        # (20, n) ring buffer of closes
+    ubuf: np.ndarray        # (14, n) ring buffer of gains
+    dbuf: np.ndarray        # (14, n) ring buffer of losses
+
+    @classmethod
+    def empty(cls, n: int) -> "_State":
+        z = lambda: np.zeros(n)
+        return cls(
+            count=np.zeros(n, dtype=np.int64), last_close=np.full(n, np.nan), last_ret1=np.full(n, np.nan),
+            ema_fast=z(), ema_slow=z(), ema_sig=z(), sum5=z(), sum20=z(), up_sum=z(), down_sum=z(),
+            cbuf=np.zeros((_W_SMA_LONG, n)), ubuf=np.zeros((_W_RSI, n)), dbuf=np.zeros((_W_RSI, n)),
+        )
+
+    def column(self, c: int) -> np.ndarray:
+        # one ticker's state packed into a flat float64 vector (field order of _STATE_FIELDS)
+        return np.concatenate([np.atleast_1d(getattr(self, f)[..., c]).astype(np.float64) for f in _STATE_FIELDS])
+
+    def set_column(self, c: int, packed: np.ndarray) -> None:
+        i = 0
+        for f in _STATE_FIELDS:
+            arr = getattr(self, f)
+            size = arr.shape[0] if arr.ndim == 2 else 1
+            arr[..., c] = packed[i] if arr.ndim == 1 else packed[i:i + size]
+            i += size
+
+    def step(self, x: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        # Consume one bar for the `valid` columns; returns (n, len(FEATURES)).
+        cols = np.arange(x.size)
+        k = self.count
+        first = k == 0
+        xs = np.where(valid, x, 1.0)
+        upd = lambda old, new: np.where(valid, new, old)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ret1 = np.where(first, np.nan, np.log(xs) - np.log(self.last_close))
+        ret2 = self.last_ret1
+
+        pos = k % _W_SMA_LONG
+        old20 = np.where(k >= _W_SMA_LONG, self.cbuf[pos, cols], 0.0)
+        old5 = np.where(k >= _W_SMA_SHORT, self.cbuf[(k - _W_SMA_SHORT) % _W_SMA_LONG, cols], 0.0)
+        self.sum20 = upd(self.sum20, self.sum20 + xs - old20)
+        self.sum5 = upd(self.sum5, self.sum5 + xs - old5)
+        self.cbuf[pos, cols] = upd(self.cbuf[pos, cols], xs)
+        sma5 = np.where(k + 1 >= _W_SMA_SHORT, self.sum5 / _W_SMA_SHORT, np.nan)
+        sma20 = np.where(k + 1 >= _W_SMA_LONG, self.sum20 / _W_SMA_LONG, np.nan)
+
+        delta = np.where(first, 0.0, xs - np.nan_to_num(self.last_close))
+        j = k - 1
+        dpos = np.maximum(j, 0) % _W_RSI
+        has_delta = valid & ~first
+        gain, loss = np.maximum(delta, 0.0), np.maximum(-delta, 0.0)
+        old_u = np.where(j >= _W_RSI, self.ubuf[dpos, cols], 0.0)
+        old_d = np.where(j >= _W_RSI, self.dbuf[dpos, cols], 0.0)
+        self.up_sum = np.where(has_delta, self.up_sum + gain - old_u, self.up_sum)
+        self.down_sum = np.where(has_delta, self.down_sum + loss - old_d, self.down_sum)
+        self.ubuf[dpos, cols] = np.where(has_delta, gain, self.ubuf[dpos, cols])
+        self.dbuf[dpos, cols] = np.where(has_delta, loss, self.dbuf[dpos, cols])
+        rs = (self.up_sum / _W_RSI) / (self.down_sum / _W_RSI + 1e-12)
+        rsi = np.where(k >= _W_RSI, 100 - (100 / (1 + rs)), np.nan)
+
+        self.ema_fast = upd(self.ema_fast, np.where(first, xs, _A_FAST * xs + (1 - _A_FAST) * self.ema_fast))
+        self.ema_slow = upd(self.ema_slow, np.where(first, xs, _A_SLOW * xs + (1 - _A_SLOW) * self.ema_slow))
+        macd = self.ema_fast - self.ema_slow
+        self.ema_sig = upd(self.ema_sig, np.where(first, macd, _A_SIG * macd + (1 - _A_SIG) * self.ema_sig))
+
+        self.last_ret1 = upd(self.last_ret1, ret1)
+        self.last_close = upd(self.last_close, xs)
+        self.count = k + valid
+
+        return np.stack([ret1, ret2, sma5, sma20, rsi, macd, self.ema_sig, macd - self.ema_sig], axis=1)
+
+@dataclass
+class _Stored:
+    dates: np.ndarray
+    closes: np.ndarray
+    values: np.ndarray
+    state: np.ndarray
+
+def _path(ticker: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9._^=-]", "_", ticker.upper())
+    return os.path.join(FEATURE_DIR, safe + ".npz")
+
+# hot tickers stay decoded in memory; the files are the source of truth
+_loaded = TTLCache(
+    max_bytes=int(float(os.getenv("FEATURE_STORE_MEMORY_MB", "128")) * 1024 * 1024),
+    ttl_seconds=24 * 3600,
+    sizer=lambda st: st.dates.nbytes + st.closes.nbytes + st.values.nbytes + st.state.nbytes,
+)
+
+def _load(ticker: str) -> Optional[_Stored]:
+    hit = _loaded.get(ticker)
+    if hit is not None:
+        return hit
+    try:
+        with np.load(_path(ticker)) as z:
+            data = z["data"]
+            st = _Stored(dates=z["dates"], closes=data[:, 0], values=data[:, 1:], state=z["state"])
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None  # missing or damaged: rebuilt from a cold state
+    _loaded.set(ticker, st)
+    return st
+
+def _save(ticker: str, stored: _Stored) -> None:
+    _loaded.set(ticker, stored)
+    path = _path(ticker)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, dates=stored.dates, data=np.column_stack([stored.closes, stored.values]), state=stored.state)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def ticker_features(prices: pd.DataFrame, persist: bool = True) -> Dict[str, pd.DataFrame]:
+    # prices: aligned close matrix (dates x tickers). Returns per-ticker
+    # feature frames on that ticker's own dates within the frame.
+    tks = [str(c) for c in prices.columns]
+    n = len(tks)
+    dates = pd.DatetimeIndex(prices.index).as_unit("ns").asi8
+    X = prices.to_numpy(dtype=np.float64)
+    T = len(dates)
+
+    state = _State.empty(n)
+    begin = np.zeros(n, dtype=np.int64)
+    stored: Dict[str, Optional[_Stored]] = {}
+    for c, t in enumerate(tks):
+        ok = ~np.isnan(X[:, c])
+        s = _load(t)
+        if s is not None and ok.any() and len(s.dates) and s.dates[0] <= dates[ok][0]:
+            # reuse only if the newest overlapping bar still has the same close
+            overlap = ok & (dates <= s.dates[-1])
+            if overlap.any():
+                r = int(np.flatnonzero(overlap)[-1])
+                k = int(np.searchsorted(s.dates, dates[r]))
+                same = k < len(s.dates) and s.dates[k] == dates[r] and np.isclose(X[r, c], s.closes[k], rtol=1e-10, atol=0.0)
+            else:
+                same = True
+            if same:
+                state.set_column(c, s.state)
+                begin[c] = int(np.searchsorted(dates, s.dates[-1], side="right"))
+                stored[t] = s
+                continue
+        stored[t] = None
+
+    r0 = int(begin.min()) if n else T
+    out = np.full((max(0, T - r0), n, len(FEATURES)), np.nan)
+    rows = np.arange(T)
+    for r in range(r0, T):
+        valid = ~np.isnan(X[r]) & (r >= begin)
+        if valid.any():
+            out[r - r0] = state.step(X[r], valid)
+
+    result = {}
+    for c, t in enumerate(tks):
+        fed = (rows >= begin[c]) & ~np.isnan(X[:, c])
+        new_dates = dates[fed]
+        new_vals = out[rows[fed] - r0, c, :] if fed.any() else np.empty((0, len(FEATURES)))
+        s = stored[t]
+        new_closes = X[fed, c]
+        if s is not None:
+            all_dates = np.concatenate([s.dates, new_dates])
+            all_closes = np.concatenate([s.closes, new_closes])
+            all_vals = np.concatenate([s.values, new_vals])
+        else:
+            all_dates, all_closes, all_vals = new_dates, new_closes, new_vals
+        if persist and len(new_dates):
+            _save(t, _Stored(dates=all_dates, closes=all_closes, values=all_vals, state=state.column(c)))
+
+        ok = ~np.isnan(X[:, c])
+        k = np.searchsorted(all_dates, dates[ok]).clip(max=max(0, len(all_dates) - 1))
+        vals = all_vals[k] if len(all_dates) else np.full((int(ok.sum()), len(FEATURES)), np.nan)
+        if len(all_dates):
+            vals[all_dates[k] != dates[ok]] = np.nan
+        result[t] = pd.DataFrame(vals, index=prices.index[ok], columns=FEATURES)
+    return result
+
+def feature_panel(prices: pd.DataFrame, persist: bool = True) -> Dict[str, pd.DataFrame]:
+    # Same features as dates x tickers frames, one per feature (for screeners).
+    per_ticker = ticker_features(prices, persist=persist)
+    return {
+        f: pd.DataFrame({t: df[f] for t, df in per_ticker.items()}).reindex(prices.index)
+        for f in FEATURES
+    }
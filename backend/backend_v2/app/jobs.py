@@ -0,0 +1,254 @@
+from __future__ import annotations
+import os
+import time
+import heapq
+import inspect
+import itertools
+import threading
+import uuid
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from . import lazy
+
+# Background job queue for CPU-heavy analytics.
+#
+# Job kinds are registered once with the function to run. Heavy kinds are
+# executed in a bounded process pool so they never occupy the request
+# threadpool; at most JOB_WORKERS run at a time and the rest wait in a
+# priority queue (higher priority first, FIFO within a priority), which is
+# why jobs are handed to the pool one at a time rather than queued inside it.
+# Kinds registered inline=True are cheap enough to run directly in the
+# submitting thread. Finished jobs keep their result for JOB_RESULT_TTL
+# seconds. Queued jobs can be cancelled outright; a job already running in a
+# worker cannot be interrupted, so it is marked cancelled and its result dropped.
+# Kinds that fan out over their own process pool (a `workers` parameter) get
+# at most JOB_INNER_WORKERS inside a job worker, so JOB_WORKERS jobs do not
+# each spawn a full pool of their own. Workers are started with
+# JOB_START_METHOD (spawn by default: forking the threaded server can copy
+# locks held by its background threads into the child). If a worker dies,
+# the jobs it took down fail and the pool is rebuilt for the next one.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+JOB_INNER_WORKERS = max(1, int(os.getenv("JOB_INNER_WORKERS", "1")))
+JOB_START_METHOD = os.getenv("JOB_START_METHOD", "spawn")
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "1000"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+@dataclass
+class _Kind:
+    target: Union[Callable[..., Any], str]  # callable or "module:function" in the analytics package
+    inline: bool
+    _fn: Optional[Callable[..., Any]] = None
+    _signature: Optional[inspect.Signature] = None
+
+    @property
+    def fn(self) -> Callable[..., Any]:
+        if self._fn is None:
+            if callable(self.target):
+                self._fn = self.target
+            else:
+                module, attr = self.target.split(":")
+                self._fn = getattr(lazy.load(module), attr)
+        return self._fn
+
+    @property
+    def signature(self) -> inspect.Signature:
+        if self._signature is None:
+            self._signature = inspect.signature(self.fn)
+        return self._signature
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    params: dict
+    priority: int
+    status: str = QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    future: Optional[Future] = None
+
+    def info(self, with_result: bool = False) -> dict:
+        out = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error is not None:
+            out["error"] = self.error
+        if with_result and self.status == DONE:
+            out["result"] = self.result
+        return out
+
+def _run(fn: Callable[..., Any], params: dict) -> Any:
+    return fn(**params)
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(1, int(workers))
+        self._lock = threading.Lock()
+        self._kinds: Dict[str, _Kind] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._running = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def register(self, kind: str, target: Union[Callable[..., Any], str], inline: bool = False) -> None:
+        # string targets ("ml:ml_train") are imported on first submit
+        self._kinds[kind] = _Kind(target=target, inline=inline)
+
+    def kinds(self) -> dict:
+        return {k: {"inline": v.inline} for k, v in sorted(self._kinds.items())}
+
+    def submit(self, kind: str, params: Optional[dict] = None, priority: int = 0) -> Job:
+        spec = self._kinds.get(kind)
+        if spec is None:
+            raise ValueError(f"Unknown job kind '{kind}'. Use one of: {', '.join(sorted(self._kinds))}")
+        params = dict(params or {})
+        try:
+            spec.signature.bind(**params)
+        except TypeError as e:
+            raise ValueError(f"Invalid params for '{kind}': {e}")
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=params, priority=int(priority))
+        self._purge()
+        if spec.inline:
+            job.status, job.started_at = RUNNING, time.time()
+            try:
+                job.result, job.status = spec.fn(**params), DONE
+            except Exception as e:
+                job.error, job.status = str(e), FAILED
+            job.finished_at = time.time()
+            with self._lock:
+                self._jobs[job.id] = job
+            return job
+
+        with self._lock:
+            if len(self._heap) >= JOB_QUEUE_MAX:
+                raise ValueError("Job queue is full, retry later")
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (-job.priority, next(self._seq), job.id))
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in (DONE, FAILED, CANCELLED):
+                return job
+            # queued jobs are skipped when popped from the heap; running ones
+            # finish in their worker and _finished() discards the result
+            job.status, job.finished_at = CANCELLED, time.time()
+            fut = job.future
+        if fut is not None:
+            fut.cancel()  # outside the lock: a successful cancel runs _finished() here
+        return job
+
+    def _dispatch(self) -> None:
+        # Hand queued jobs to the pool while there are free worker slots.
+        while True:
+            with self._lock:
+                if self._running >= self.workers:
+                    return
+                job = None
+                while self._heap:
+                    _, _, job_id = heapq.heappop(self._heap)
+                    cand = self._jobs.get(job_id)
+                    if cand is not None and cand.status == QUEUED:
+                        job = cand
+                        break
+                if job is None:
+                    return
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(JOB_START_METHOD))
+                pool = self._pool
+                job.status, job.started_at = RUNNING, time.time()
+                self._running += 1
+                spec, params = self._kinds[job.kind], job.params
+                if "workers" in spec.signature.parameters:
+                    asked = params.get("workers")
+                    params = {**params, "workers": min(int(asked), JOB_INNER_WORKERS) if asked else JOB_INNER_WORKERS}
+                try:
+                    job.future, broken = pool.submit(_run, spec.fn, params), None
+                except BrokenProcessPool as e:
+                    self._running -= 1
+                    job.status, job.finished_at = FAILED, time.time()
+                    job.error = f"Worker pool failed: {e}"
+                    broken = self._detach_pool(pool)
+            if job.future is None:
+                if broken is not None:
+                    broken.shutdown(wait=False)
+                continue
+            job.future.add_done_callback(lambda fut, job=job, pool=pool: self._finished(job, fut, pool))
+
+    def _detach_pool(self, pool: ProcessPoolExecutor) -> Optional[ProcessPoolExecutor]:
+        # Called under self._lock; the next dispatch starts a fresh pool. The
+        # caller shuts the returned pool down after releasing the lock.
+        if self._pool is not pool:
+            return None
+        self._pool = None
+        return pool
+
+    def _finished(self, job: Job, fut: Future, pool: ProcessPoolExecutor) -> None:
+        broken = None
+        with self._lock:
+            self._running -= 1
+            if not fut.cancelled() and isinstance(fut.exception(), BrokenProcessPool):
+                broken = self._detach_pool(pool)
+            if job.status == RUNNING:
+                job.finished_at = time.time()
+                try:
+                    job.result, job.status = fut.result(), DONE
+                except Exception as e:
+                    job.error, job.status = str(e) or type(e).__name__, FAILED
+            job.future = None
+        if broken is not None:
+            broken.shutdown(wait=False)
+        self._dispatch()
+
+    def _purge(self) -> None:
+        now = time.time()
+        with self._lock:
+            expired = [
+                k for k, j in self._jobs.items()
+                if j.finished_at is not None and j.status != RUNNING and now - j.finished_at > JOB_RESULT_TTL
+            ]
+            for k in expired:
+                del self._jobs[k]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for j in self._jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+            return {"workers": self.workers, "running": self._running, "jobs": counts}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+            for j in self._jobs.values():
+                if j.status == QUEUED:
+                    j.status, j.finished_at = CANCELLED, time.time()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+JOBS = JobQueue()
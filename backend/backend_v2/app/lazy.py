@@ -0,0 +1,80 @@
+from __future__ import annotations
+import os
+import sys
+import time
+import importlib
+import threading
+from types import ModuleType
+from typing import Dict, List
+
+# Deferred loading of the analytics modules.
+#
+# main.py only imports the light plumbing (data, caches, encoding, jobs,
+# metrics) at startup; each route pulls its analytics module through load()
+# on first use, so statsmodels / pypfopt+cvxpy / arch / scikit-learn / scipy
+# are only paid for by the workers that actually serve those routes.
+# PREWARM_MODULES ("all" or a comma list) imports some of them right after
+# startup, in the background unless PREWARM_BLOCKING=1. Every first import
+# is timed for the startup report (/api/startup); a module's cost includes
+# whatever dependencies it was first to pull in, so it depends on load order.
+ANALYTICS = ("pairs", "screener", "streaming", "portfolio", "backtest", "options",
+             "volatility", "ml", "market_making", "research")
+HEAVY_PACKAGES = ("statsmodels", "pypfopt", "cvxpy", "arch", "sklearn", "scipy", "yfinance")
+PREWARM_MODULES = os.getenv("PREWARM_MODULES", "")
+PREWARM_BLOCKING = os.getenv("PREWARM_BLOCKING", "0") == "1"
+
+_lock = threading.Lock()
+_imports: Dict[str, dict] = {}
+_startup: Dict[str, float] = {}
+
+def load(name: str) -> ModuleType:
+    qualified = f"{__package__}.{name}"
+    mod = sys.modules.get(qualified)
+    if mod is not None and name in _imports:
+        return mod
+    t0 = time.perf_counter()
+    n0 = len(sys.modules)
+    mod = importlib.import_module(qualified)  # waits if another thread is mid-import
+    with _lock:
+        if name not in _imports:
+            _imports[name] = {
+                "seconds": round(time.perf_counter() - t0, 4),
+                "new_modules": len(sys.modules) - n0,
+                "at": round(time.time(), 3),
+            }
+    return mod
+
+def is_loaded(name: str) -> bool:
+    return name in _imports
+
+def prewarm_targets() -> List[str]:
+    spec = PREWARM_MODULES.strip().lower()
+    if not spec:
+        return []
+    if spec == "all":
+        return list(ANALYTICS)
+    names = [n.strip() for n in spec.split(",") if n.strip()]
+    unknown = [n for n in names if n not in ANALYTICS]
+    if unknown:
+        raise ValueError(f"Unknown PREWARM_MODULES entries: {', '.join(unknown)}")
+    return names
+
+def prewarm() -> None:
+    t0 = time.perf_counter()
+    for name in prewarm_targets():
+        load(name)
+    _startup["prewarm_seconds"] = round(time.perf_counter() - t0, 4)
+
+def mark_startup(phase: str, seconds: float) -> None:
+    _startup[phase] = round(seconds, 4)
+
+def report() -> dict:
+    with _lock:
+        imports = {k: dict(v) for k, v in _imports.items()}
+    return {
+        "startup": dict(_startup),
+        "prewarm": {"modules": PREWARM_MODULES or None, "blocking": PREWARM_BLOCKING},
+        "analytics": {name: imports.get(name, {"loaded": False}) for name in ANALYTICS},
+        "heavy_packages_loaded": [p for p in HEAVY_PACKAGES if p in sys.modules],
+        "modules_loaded": len(sys.modules),
+    }
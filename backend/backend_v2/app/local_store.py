@@ -0,0 +1,250 @@
+from __future__ import annotations
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Local bulk-history provider (PRICE_PROVIDER=local).
+#
+# Layout under LOCAL_DATA_DIR:
+#   CURRENT              name of the active version directory
+#   <version>/dates.npy  int64 UTC ns bar timestamps, sorted (T,)
+#   <version>/close.npy  float64 closes, one contiguous row per ticker (N, T), NaN = no bar
+#   <version>/index.json tickers in row order, first/last valid column per ticker, interval
+#
+# Both arrays are memory-mapped, so a request only touches the pages of the
+# rows and date range it asks for. The importer below builds a new version
+# directory and then swaps CURRENT, so readers never see a partial dataset;
+# mappings already open on the previous version stay valid until released.
+# The last LOCAL_KEEP_VERSIONS superseded versions are kept on disk so a
+# reader that resolved CURRENT just before a swap can still open them, and
+# CURRENT itself is re-read at most every LOCAL_VERSION_TTL seconds.
+LOCAL_DATA_DIR = os.getenv("LOCAL_DATA_DIR", os.path.join(".cache", "local"))
+LOCAL_KEEP_VERSIONS = int(os.getenv("LOCAL_KEEP_VERSIONS", "2"))
+LOCAL_VERSION_TTL = float(os.getenv("LOCAL_VERSION_TTL", "1.0"))
+
+class LocalDataset:
+    def __init__(self, path: str):
+        with open(os.path.join(path, "index.json"), "r") as f:
+            meta = json.load(f)
+        self.path = path
+        self.version = os.path.basename(path)
+        self.interval = meta.get("interval", "1d")
+        self.tickers: List[str] = meta["tickers"]
+        self.first = np.asarray(meta["first"], dtype=np.int64)
+        self.last = np.asarray(meta["last"], dtype=np.int64)
+        self.rows: Dict[str, int] = {t: i for i, t in enumerate(self.tickers)}
+        self.dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+        self.close = np.load(os.path.join(path, "close.npy"), mmap_mode="r")
+        if self.close.shape != (len(self.tickers), len(self.dates)):
+            raise ValueError(f"Corrupt local dataset at {path}")
+
+    def frame(self, tickers: List[str], start_ns: int, end_ns: Optional[int] = None) -> pd.DataFrame:
+        found = [t for t in tickers if t in self.rows]
+        if not found:
+            return pd.DataFrame()
+        rows = np.array([self.rows[t] for t in found])
+        lo = int(np.searchsorted(self.dates, start_ns, side="left"))
+        hi = len(self.dates) if end_ns is None else int(np.searchsorted(self.dates, end_ns, side="right"))
+        # trim to the span where any requested ticker has data
+        lo = max(lo, int(self.first[rows].min()))
+        hi = min(hi, int(self.last[rows].max()) + 1)
+        if hi <= lo:
+            return pd.DataFrame()
+        block = np.array(self.close[rows, lo:hi]).T  # copies only the requested pages
+        idx = pd.DatetimeIndex(np.asarray(self.dates[lo:hi]), tz="UTC")
+        df = pd.DataFrame(block, index=idx, columns=found)
+        return df.dropna(how="all")
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "interval": self.interval,
+            "tickers": len(self.tickers),
+            "bars": int(len(self.dates)),
+            "start": str(pd.Timestamp(int(self.dates[0]), tz="UTC").date()) if len(self.dates) else None,
+            "end": str(pd.Timestamp(int(self.dates[-1]), tz="UTC").date()) if len(self.dates) else None,
+            "bytes": int(self.close.nbytes + self.dates.nbytes),
+        }
+
+_lock = threading.Lock()
+_open: Dict[str, LocalDataset] = {}
+_versions: Dict[str, Tuple[Optional[str], float]] = {}  # root -> (version, read at)
+
+def current_version(root: Optional[str] = None, max_age: float = LOCAL_VERSION_TTL) -> Optional[str]:
+    root = root or LOCAL_DATA_DIR
+    now = time.monotonic()
+    cached = _versions.get(root)
+    if cached is not None and now - cached[1] < max_age:
+        return cached[0]
+    try:
+        with open(os.path.join(root, "CURRENT"), "r") as f:
+            version = f.read().strip() or None
+    except OSError:
+        version = None
+    _versions[root] = (version, now)
+    return version
+
+def dataset(root: Optional[str] = None) -> Optional[LocalDataset]:
+    root = root or LOCAL_DATA_DIR
+    for max_age in (LOCAL_VERSION_TTL, 0.0):
+        version = current_version(root, max_age=max_age)
+        if version is None:
+            return None
+        with _lock:
+            ds = _open.get(root)
+            if ds is not None and ds.version == version:
+                return ds
+            try:
+                ds = LocalDataset(os.path.join(root, version))
+            except OSError:
+                continue  # version removed since CURRENT was read; re-read it once
+            _open[root] = ds
+            return ds
+    raise ValueError(f"Local dataset in {root} is being replaced; retry")
+
+def local_prices(tickers: List[str], start_ns: int, interval: str = "1d") -> pd.DataFrame:
+    ds = dataset()
+    if ds is None:
+        raise ValueError(f"No local dataset in {LOCAL_DATA_DIR}; import one with `python -m app.local_store import`")
+    if ds.interval != interval:
+        raise ValueError(f"Local dataset holds {ds.interval} bars, not {interval}")
+    return ds.frame(tickers, start_ns)
+
+# ---- CSV importer ----
+_DATE_COLS = ("date", "datetime", "timestamp", "time")
+_TICKER_COLS = ("ticker", "symbol")
+_CLOSE_COLS = ("adj close", "adj_close", "adjclose", "close")
+
+def _pick(columns: Dict[str, str], names) -> Optional[str]:
+    for n in names:
+        if n in columns:
+            return columns[n]
+    return None
+
+def _read_csv(path: str) -> Dict[str, pd.Series]:
+    # Accepts long (date, ticker, close), per-ticker (date, close; ticker from
+    # the file name) or wide (date + one column per ticker) CSVs.
+    df = pd.read_csv(path)
+    cols = {c.strip().lower(): c for c in df.columns}
+    date_col = _pick(cols, _DATE_COLS)
+    if date_col is None:
+        raise ValueError(f"{path}: no date column (expected one of {', '.join(_DATE_COLS)})")
+    dates = pd.to_datetime(df[date_col], utc=True)
+    ticker_col, close_col = _pick(cols, _TICKER_COLS), _pick(cols, _CLOSE_COLS)
+
+    out: Dict[str, pd.Series] = {}
+    if ticker_col is not None and close_col is not None:
+        frame = pd.DataFrame({"date": dates, "ticker": df[ticker_col].astype(str).str.upper(),
+                              "close": pd.to_numeric(df[close_col], errors="coerce")})
+        for t, g in frame.groupby("ticker", sort=False):
+            out[t] = pd.Series(g["close"].to_numpy(), index=pd.DatetimeIndex(g["date"]))
+    elif close_col is not None:
+        ticker = os.path.splitext(os.path.basename(path))[0].split(".")[0].upper()
+        out[ticker] = pd.Series(pd.to_numeric(df[close_col], errors="coerce").to_numpy(), index=pd.DatetimeIndex(dates))
+    else:
+        for c in df.columns:
+            if c == date_col:
+                continue
+            out[str(c).strip().upper()] = pd.Series(pd.to_numeric(df[c], errors="coerce").to_numpy(), index=pd.DatetimeIndex(dates))
+    return out
+
+def import_csv(paths: List[str], root: Optional[str] = None, interval: str = "1d", merge: bool = False) -> dict:
+    root = root or LOCAL_DATA_DIR
+    files: List[str] = []
+    for p in paths:
+        files += sorted(glob.glob(os.path.join(p, "*.csv"))) if os.path.isdir(p) else [p]
+    if not files:
+        raise ValueError("No CSV files to import")
+
+    series: Dict[str, pd.Series] = {}
+    if merge:
+        ds = dataset(root)
+        if ds is not None:
+            if ds.interval != interval:
+                raise ValueError(f"Cannot merge {interval} bars into the current {ds.interval} dataset")
+            for t, i in ds.rows.items():
+                s = pd.Series(np.asarray(ds.close[i]), index=pd.DatetimeIndex(np.asarray(ds.dates), tz="UTC"))
+                series[t] = s.dropna()
+    for path in files:
+        for t, s in _read_csv(path).items():
+            s = s[~s.index.duplicated(keep="last")].dropna()
+            s = s[s > 0]
+            # later files win on overlapping bars
+            series[t] = s.combine_first(series[t]) if t in series else s
+    series = {t: s for t, s in series.items() if len(s)}
+    if not series:
+        raise ValueError("No usable rows in the CSV input")
+
+    tickers = sorted(series)
+    date_ns = np.unique(np.concatenate([pd.DatetimeIndex(s.index).as_unit("ns").asi8 for s in series.values()]))
+
+    # never reuse a name: a live version's files may still be memory-mapped
+    now = time.time_ns()
+    version = time.strftime("v%Y%m%d%H%M%S", time.gmtime(now // 10**9)) + f".{now % 10**9:09d}-{os.getpid()}"
+    path = os.path.join(root, version)
+    os.makedirs(root, exist_ok=True)
+    os.makedirs(path)
+    close = np.lib.format.open_memmap(os.path.join(path, "close.npy"), mode="w+", dtype=np.float64,
+                                      shape=(len(tickers), len(date_ns)))
+    first, last = [], []
+    for i, t in enumerate(tickers):
+        s = series[t].sort_index()
+        pos = np.searchsorted(date_ns, pd.DatetimeIndex(s.index).as_unit("ns").asi8)
+        row = np.full(len(date_ns), np.nan)
+        row[pos] = s.to_numpy(dtype=np.float64)
+        close[i] = row
+        first.append(int(pos[0]))
+        last.append(int(pos[-1]))
+    close.flush()
+    del close
+    np.save(os.path.join(path, "dates.npy"), date_ns)
+    with open(os.path.join(path, "index.json"), "w") as f:
+        json.dump({"tickers": tickers, "first": first, "last": last, "interval": interval,
+                   "created_at": time.time(), "sources": len(files)}, f)
+
+    tmp = os.path.join(root, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, "CURRENT"))
+    _versions[root] = (version, time.monotonic())
+    # version names sort by creation time; keep the newest superseded ones
+    old = sorted((d for d in os.listdir(root) if d.startswith("v") and d != version
+                  and os.path.isdir(os.path.join(root, d))), reverse=True)
+    for d in old[LOCAL_KEEP_VERSIONS:]:
+        shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+
+    return LocalDataset(path).info()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.local_store", description="Local bulk price history")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="convert CSV dumps (files or directories) into the local layout")
+    imp.add_argument("paths", nargs="+")
+    imp.add_argument("--dir", default=None, help=f"dataset root (default LOCAL_DATA_DIR={LOCAL_DATA_DIR})")
+    imp.add_argument("--interval", default="1d")
+    imp.add_argument("--merge", action="store_true", help="merge into the current dataset instead of replacing it")
+    info = sub.add_parser("info", help="describe the current dataset")
+    info.add_argument("--dir", default=None)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "import":
+        print(json.dumps(import_csv(args.paths, root=args.dir, interval=args.interval, merge=args.merge), indent=2))
+        return 0
+    ds = dataset(args.dir)
+    if ds is None:
+        print(f"no local dataset in {args.dir or LOCAL_DATA_DIR}", file=sys.stderr)
+        return 1
+    print(json.dumps(ds.info(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
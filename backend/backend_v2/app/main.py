@@ -1,21 +1,54 @@
 from __future__ import annotations
+import time
+_IMPORT_T0 = time.perf_counter()
 import os
-from fastapi import FastAPI, Query
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
-from .pairs import pairs_analyze
-from .portfolio import optimize_portfolio
-from .options import black_scholes
-from .volatility import volatility_forecast
-from .ml import ml_predict
-from .market_making import simulate_market_making
-from .research import replicate as research_replicate
+# Analytics modules (pairs, portfolio, volatility, ml, ...) are imported on
+# first use through lazy.load(); see app/lazy.py.
+from . import bars, batch, lazy, metrics, model_registry, response_cache
+from .data import normalize_interval, price_cache_stats, run_refresh_scheduler
+from .encoding import SerializingRoute, downsample, encode_points, json_response, points_format, render
+from .jobs import JOBS
 
 load_dotenv()
 
-app = FastAPI(title="AlphaTerminal Backend v2", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    t0 = time.perf_counter()
+    tasks = []
+    if lazy.prewarm_targets():
+        if lazy.PREWARM_BLOCKING:
+            await asyncio.to_thread(lazy.prewarm)
+        else:
+            tasks.append(asyncio.create_task(asyncio.to_thread(lazy.prewarm)))
+    # refresh hot price sets ahead of expiry; prewarms PRICE_PREWARM_UNIVERSE first
+    tasks.append(asyncio.create_task(run_refresh_scheduler()))
+    # the pairs monitor only needs its module once something is watched
+    tasks.append(asyncio.create_task(_run_monitor_maintenance()))
+    lazy.mark_startup("lifespan_seconds", time.perf_counter() - t0)
+    try:
+        yield
+    finally:
+        for t in tasks:
+            t.cancel()
+        JOBS.shutdown()
+
+async def _run_monitor_maintenance() -> None:
+    while not lazy.is_loaded("streaming"):
+        await asyncio.sleep(5.0)
+    await lazy.load("streaming").MONITOR.run_maintenance()
+
+app = FastAPI(title="AlphaTerminal Backend v2", version="0.1.0", lifespan=lifespan)
+app.router.route_class = SerializingRoute  # must precede the route decorators
+app.add_middleware(metrics.MetricsMiddleware)
 
 origins = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
 app.add_middleware(
@@ -24,12 +57,67 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing"],
 )
 
 @app.get("/api/health")
-def health():
+async def health():
     return {"status": "ok", "service": "AlphaTerminal Backend v2"}
 
+@app.get("/api/startup")
+def api_startup():
+    return lazy.report()
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return {"prices": price_cache_stats(), "responses": response_cache.stats()}
+
+CACHE_GAUGE = metrics.Gauge("cache", "Cache statistics by cache and field", ("cache", "field"))
+JOBS_GAUGE = metrics.Gauge("jobs", "Background jobs by status", ("status",))
+
+def _collect_stats() -> None:
+    caches = {
+        "prices": price_cache_stats(),
+        "responses": response_cache.stats()["memory"],
+        "models": model_registry.stats()["memory"],
+    }
+    for name, st in caches.items():
+        for field in ("entries", "bytes", "hits", "misses", "evictions", "expirations", "coalesced"):
+            CACHE_GAUGE.set(name, field, value=st[field])
+    jobs = JOBS.stats()
+    for status in ("queued", "running", "done", "failed", "cancelled"):
+        JOBS_GAUGE.set(status, value=jobs["jobs"].get(status, 0))
+
+metrics.register_collector(_collect_stats)
+
+@app.get("/api/metrics")
+def api_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# ---------- Prices ----------
+@app.get("/api/prices/bars")
+def api_price_bars(
+    ticker: str = Query(...),
+    period: str = Query("5d"),
+    interval: str = Query("5m"),
+    max_points: int | None = Query(None, ge=10),
+    format: str | None = Query(None),
+    accept: str | None = Header(None),
+):
+    fmt = points_format(format, accept)
+    iv = normalize_interval(interval)
+    tk = ticker.upper()
+    df = bars.get_bars(tk, period=period, interval=iv)
+    out = downsample(df, max_points, y="close")
+    out = out.assign(date=bars.date_labels(out.index, iv)).reset_index(drop=True)
+    return render({
+        "ticker": tk,
+        "interval": iv,
+        "source_interval": bars.source_interval(iv, period)[0],
+        "bars": len(df),
+        "points": encode_points(out[["date", *bars.FIELDS]], fmt),
+    }, fmt)
+
 # ---------- Pairs ----------
 @app.get("/api/pairs/analyze")
 def api_pairs_analyze(
@@ -37,8 +125,67 @@ def api_pairs_analyze(
     ticker2: str = Query(...),
     period: str = Query("1y"),
     window: int = Query(30, ge=5, le=200),
+    hedge: str = Query("ols"),
+    kalman_delta: float = Query(1e-4, gt=0, lt=1),
+    kalman_obs_var: float = Query(1e-3, gt=0),
+    interval: str = Query("1d"),
+    max_points: int | None = Query(None, ge=10),
+    format: str | None = Query(None),
+    accept: str | None = Header(None),
+    if_none_match: str | None = Header(None),
+):
+    fmt = points_format(format, accept)
+    iv = normalize_interval(interval)
+    t1, t2 = ticker1.upper(), ticker2.upper()
+    params = {"ticker1": t1, "ticker2": t2, "period": period, "window": window,
+              "hedge": hedge.lower(), "kalman_delta": kalman_delta, "kalman_obs_var": kalman_obs_var,
+              "interval": iv, "max_points": max_points}
+    return response_cache.cached_response(
+        "pairs/analyze", params, [t1, t2], period,
+        lambda: lazy.load("pairs").pairs_analyze(t1, t2, period=period, window=window, points_format=fmt, hedge=hedge,
+                              kalman_delta=kalman_delta, kalman_obs_var=kalman_obs_var,
+                              interval=iv, max_points=max_points),
+        fmt=fmt, if_none_match=if_none_match, interval=iv,
+    )
+
+@app.get("/api/pairs/stream")
+async def api_pairs_stream(
+    ticker1: str = Query(...),
+    ticker2: str = Query(...),
+    window: int = Query(30, ge=5, le=200),
 ):
-    return pairs_analyze(ticker1.upper(), ticker2.upper(), period=period, window=window)
+    t1, t2 = ticker1.upper(), ticker2.upper()
+    streaming = await asyncio.to_thread(lazy.load, "streaming")
+    await asyncio.to_thread(streaming.MONITOR.watch, t1, t2, window)
+    return StreamingResponse(
+        streaming.sse_stream(streaming.MONITOR, streaming.pair_key(t1, t2, window)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class PairsTicksReq(BaseModel):
+    prices: dict[str, float]
+    ts: str | None = None
+
+@app.post("/api/pairs/ticks")
+def api_pairs_ticks(req: PairsTicksReq):
+    updated = lazy.load("streaming").MONITOR.push_prices({t.strip().upper(): p for t, p in req.prices.items()}, ts=req.ts)
+    return {"updated": updated}
+
+@app.get("/api/pairs/watched")
+def api_pairs_watched():
+    monitor = lazy.load("streaming").MONITOR
+    return {**monitor.stats(), "watched": [st.snapshot() for st in list(monitor.pairs.values())]}
+
+class PairsScreenReq(BaseModel):
+    tickers: list[str] = Field(..., min_length=2)
+    period: str = "2y"
+    top_k: int = Field(10, ge=1, le=500)
+
+@app.post("/api/pairs/screen")
+def api_pairs_screen(req: PairsScreenReq):
+    tks = list(dict.fromkeys(t.strip().upper() for t in req.tickers if t.strip()))
+    return lazy.load("screener").screen_pairs(tks, period=req.period, top_k=req.top_k)
 
 # ---------- Portfolio ----------
 class PortfolioReq(BaseModel):
@@ -47,9 +194,52 @@ class PortfolioReq(BaseModel):
     risk_free_rate: float = 0.02
 
 @app.post("/api/portfolio/optimize")
-def api_portfolio_optimize(req: PortfolioReq):
+def api_portfolio_optimize(req: PortfolioReq, if_none_match: str | None = Header(None)):
+    tks = [t.strip().upper() for t in req.tickers if t.strip()]
+    if len(tks) < 2:
+        raise ValueError("Provide at least 2 tickers")
+    return response_cache.cached_response(
+        "portfolio/optimize", {"tickers": tks, "period": req.period, "risk_free_rate": req.risk_free_rate},
+        tks, req.period,
+        lambda: lazy.load("portfolio").optimize_portfolio(tks, period=req.period, risk_free_rate=req.risk_free_rate),
+        if_none_match=if_none_match,
+    )
+
+class FrontierReq(PortfolioReq):
+    n_points: int = Field(25, ge=2, le=200)
+
+@app.post("/api/portfolio/frontier")
+def api_portfolio_frontier(req: FrontierReq):
+    tks = [t.strip().upper() for t in req.tickers if t.strip()]
+    return lazy.load("portfolio").efficient_frontier(tks, period=req.period, n_points=req.n_points, risk_free_rate=req.risk_free_rate)
+
+class BacktestReq(BaseModel):
+    tickers: list[str] = Field(..., min_length=2)
+    period: str = "10y"
+    lookback: int = Field(252, ge=20, le=2520)
+    rebalance: str = "monthly"
+    objective: str = "max_sharpe"
+    risk_free_rate: float = 0.02
+    cost_bps: float = Field(0.0, ge=0)
+
+@app.post("/api/portfolio/backtest")
+def api_portfolio_backtest(
+    req: BacktestReq,
+    format: str | None = Query(None),
+    accept: str | None = Header(None),
+):
+    fmt = points_format(format, accept)
     tks = [t.strip().upper() for t in req.tickers if t.strip()]
-    return optimize_portfolio(tks, period=req.period, risk_free_rate=req.risk_free_rate)
+    return render(lazy.load("backtest").backtest_portfolio(
+        tks,
+        period=req.period,
+        lookback=req.lookback,
+        rebalance=req.rebalance,
+        objective=req.objective,
+        risk_free_rate=req.risk_free_rate,
+        cost_bps=req.cost_bps,
+        points_format=fmt,
+    ), fmt)
 
 # ---------- Options ----------
 @app.get("/api/options/price")
@@ -60,8 +250,61 @@ def api_options_price(
     r: float = Query(...),
     sigma: float = Query(..., gt=0),
 ):
-    res = black_scholes(S, K, T, r, sigma)
-    return {"call": round(res.call, 6), "put": round(res.put, 6), "d1": round(res.d1, 6), "d2": round(res.d2, 6)}
+    return lazy.load("options").option_price(S, K, T, r, sigma)
+
+class OptionsChainReq(BaseModel):
+    # Either per-contract arrays (S/K/T/r/sigma broadcast together) or a
+    # strike x expiry grid via `strikes` + `expiries`.
+    S: float | list[float]
+    K: float | list[float] | None = None
+    T: float | list[float] | None = None
+    strikes: list[float] | None = None
+    expiries: list[float] | None = None
+    r: float | list[float] = 0.0
+    sigma: float | list[float]
+    float32: bool = False
+
+@app.post("/api/options/chain")
+def api_options_chain(req: OptionsChainReq):
+    options = lazy.load("options")
+    dtype = "float32" if req.float32 else "float64"
+    if req.strikes is not None and req.expiries is not None:
+        res = options.black_scholes_grid(req.S, req.strikes, req.expiries, req.r, req.sigma, dtype=dtype)
+    elif req.K is not None and req.T is not None:
+        res = options.black_scholes_chain(req.S, req.K, req.T, req.r, req.sigma, dtype=dtype)
+    else:
+        raise ValueError("Provide K and T, or strikes and expiries")
+    out = {k: v.tolist() for k, v in res.__dict__.items()}
+    out["shape"] = list(res.call.shape)
+    return out
+
+def _nan_to_none(values):
+    # JSON has no NaN; unconverged / empty cells are returned as null
+    if isinstance(values, list):
+        return [_nan_to_none(v) for v in values]
+    return None if values != values else values
+
+class IVSurfaceReq(BaseModel):
+    S: float = Field(..., gt=0)
+    r: float = 0.0
+    strikes: list[float]
+    expiries: list[float]
+    prices: list[float]
+    is_call: bool | list[bool] = True
+
+@app.post("/api/options/iv-surface")
+def api_options_iv_surface(req: IVSurfaceReq):
+    surf = lazy.load("options").implied_vol_surface(req.S, req.strikes, req.expiries, req.prices, r=req.r, is_call=req.is_call)
+    return {
+        "strikes": surf["strikes"].tolist(),
+        "expiries": surf["expiries"].tolist(),
+        "iv": _nan_to_none(surf["iv"].tolist()),
+        "quote_iv": _nan_to_none(surf["quote_iv"].tolist()),
+        "n_quotes": len(req.prices),
+        "n_failed": int(surf["failed"].size),
+        "failed": surf["failed"].tolist(),
+        "iterations": surf["iterations"],
+    }
 
 # ---------- Volatility ----------
 @app.get("/api/volatility/forecast")
@@ -69,8 +312,22 @@ def api_vol_forecast(
     ticker: str = Query(...),
     period: str = Query("2y"),
     model: str = Query("garch"),
+    interval: str = Query("1d"),
+    max_points: int | None = Query(None, ge=10),
+    format: str | None = Query(None),
+    accept: str | None = Header(None),
+    if_none_match: str | None = Header(None),
 ):
-    return volatility_forecast(ticker.upper(), period=period, model=model)
+    fmt = points_format(format, accept)
+    iv = normalize_interval(interval)
+    tk = ticker.upper()
+    params = {"ticker": tk, "period": period, "model": model, "interval": iv, "max_points": max_points}
+    return response_cache.cached_response(
+        "volatility/forecast", params, [tk], period,
+        lambda: lazy.load("volatility").volatility_forecast(tk, period=period, model=model, points_format=fmt,
+                                                            interval=iv, max_points=max_points),
+        fmt=fmt, if_none_match=if_none_match, interval=iv,
+    )
 
 # ---------- ML ----------
 class MLReq(BaseModel):
@@ -81,7 +338,28 @@ class MLReq(BaseModel):
 
 @app.post("/api/ml/predict")
 def api_ml_predict(req: MLReq):
-    return ml_predict(req.ticker.upper(), req.model, req.horizon_days, req.train_years)
+    return lazy.load("ml").ml_predict(req.ticker.upper(), req.model, req.horizon_days, req.train_years)
+
+@app.post("/api/ml/train")
+def api_ml_train(req: MLReq):
+    return lazy.load("ml").ml_train(req.ticker.upper(), req.model, req.horizon_days, req.train_years)
+
+class MLWalkForwardReq(MLReq):
+    train_window: int = Field(500, ge=50)
+    test_window: int = Field(21, ge=1)
+    step: int = Field(21, ge=1)
+    max_folds: int = Field(50, ge=1, le=500)
+
+@app.post("/api/ml/walk-forward")
+def api_ml_walk_forward(req: MLWalkForwardReq):
+    return lazy.load("ml").ml_walk_forward(
+        req.ticker.upper(), req.model, req.horizon_days, req.train_years,
+        train_window=req.train_window, test_window=req.test_window, step=req.step, max_folds=req.max_folds,
+    )
+
+@app.get("/api/ml/registry")
+def api_ml_registry():
+    return model_registry.stats()
 
 # ---------- Market Making ----------
 class MMSimReq(BaseModel):
@@ -92,13 +370,38 @@ class MMSimReq(BaseModel):
     seed: int = 42
 
 @app.post("/api/market-making/simulate")
-def api_mm_simulate(req: MMSimReq):
-    return simulate_market_making(
+def api_mm_simulate(
+    req: MMSimReq,
+    format: str | None = Query(None),
+    accept: str | None = Header(None),
+):
+    fmt = points_format(format, accept)
+    return render(lazy.load("market_making").simulate_market_making(
         steps=req.steps,
         sigma=req.sigma,
         base_spread=req.base_spread,
         inventory_limit=req.inventory_limit,
         seed=req.seed,
+        points_format=fmt,
+    ), fmt)
+
+class MMSweepReq(BaseModel):
+    steps: int = Field(500, ge=1, le=10000)
+    sigmas: list[float] = Field(default_factory=lambda: [0.01], min_length=1)
+    base_spreads: list[float] = Field(default_factory=lambda: [0.02], min_length=1)
+    inventory_limits: list[int] = Field(default_factory=lambda: [50], min_length=1)
+    n_seeds: int = Field(100, ge=1)
+    seed: int = 42
+
+@app.post("/api/market-making/sweep")
+def api_mm_sweep(req: MMSweepReq):
+    return lazy.load("market_making").sweep_market_making(
+        steps=req.steps,
+        sigmas=req.sigmas,
+        base_spreads=req.base_spreads,
+        inventory_limits=req.inventory_limits,
+        n_seeds=req.n_seeds,
+        seed=req.seed,
     )
 
 # ---------- Research ----------
@@ -109,8 +412,76 @@ class ResearchReq(BaseModel):
 @app.post("/api/research/replicate")
 def api_research(req: ResearchReq):
     tks = [t.strip().upper() for t in (req.tickers or []) if t.strip()] or None
-    return research_replicate(req.paper_id, tickers=tks)
+    return lazy.load("research").replicate(req.paper_id, tickers=tks)
+
+# ---------- Batch ----------
+class BatchItem(BaseModel):
+    id: str | None = None
+    type: str
+    params: dict = Field(default_factory=dict)
+
+class BatchReq(BaseModel):
+    requests: list[BatchItem] = Field(..., min_length=1)
+
+@app.post("/api/batch")
+def api_batch(req: BatchReq):
+    # sub-results may carry NaN (e.g. unaligned intraday prices); _dumps writes them as null
+    return json_response(jsonable_encoder(batch.run_batch([r.model_dump() for r in req.requests])))
+
+# ---------- Jobs ----------
+# Heavy analytics run in the job process pool; inline kinds are cheap enough
+# to answer directly from the submit call.
+JOBS.register("pairs_analyze", "pairs:pairs_analyze", inline=True)
+JOBS.register("pairs_screen", "screener:screen_pairs")
+JOBS.register("portfolio_optimize", "portfolio:optimize_portfolio")
+JOBS.register("portfolio_frontier", "portfolio:efficient_frontier")
+JOBS.register("portfolio_backtest", "backtest:backtest_portfolio")
+JOBS.register("volatility_forecast", "volatility:volatility_forecast")
+JOBS.register("ml_train", "ml:ml_train")
+JOBS.register("ml_predict", "ml:ml_predict")
+JOBS.register("ml_walk_forward", "ml:ml_walk_forward")
+JOBS.register("market_making_sweep", "market_making:sweep_market_making")
+JOBS.register("research_replicate", "research:replicate")
+
+class JobReq(BaseModel):
+    kind: str
+    params: dict = Field(default_factory=dict)
+    priority: int = Field(0, ge=-10, le=10)
+
+def _job_or_404(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id")
+    return job
+
+@app.post("/api/jobs")
+def api_jobs_submit(req: JobReq):
+    if req.params.get("points_format") == "binary":
+        raise ValueError("Job results are JSON; use points_format 'records' or 'columnar'")
+    return JOBS.submit(req.kind, req.params, priority=req.priority).info(with_result=True)
+
+@app.get("/api/jobs")
+def api_jobs_stats():
+    return {**JOBS.stats(), "kinds": JOBS.kinds()}
+
+@app.get("/api/jobs/{job_id}")
+def api_jobs_status(job_id: str):
+    return _job_or_404(job_id).info()
+
+@app.get("/api/jobs/{job_id}/result")
+def api_jobs_result(job_id: str):
+    job = _job_or_404(job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=job.info())
+    return job.result
+
+@app.delete("/api/jobs/{job_id}")
+def api_jobs_cancel(job_id: str):
+    _job_or_404(job_id)
+    return JOBS.cancel(job_id).info()
+
 
+lazy.mark_startup("main_import_seconds", time.perf_counter() - _IMPORT_T0)
 
 # __VALUE_ERROR_HANDLER_INSTALLED__
 from fastapi import Request
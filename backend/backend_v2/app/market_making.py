@@ -1,13 +1,18 @@
 from __future__ import annotations
 import numpy as np
+import pandas as pd
+from .encoding import encode_points
 
-def simulate_market_making(steps=500, sigma=0.01, base_spread=0.02, inventory_limit=50, seed=42):
+def simulate_market_making(steps=500, sigma=0.01, base_spread=0.02, inventory_limit=50, seed=42, points_format="records"):
     rng = np.random.default_rng(seed)
     mid = 100.0
     cash = 0.0
     inv = 0
+    steps = max(0, int(steps))
 
-    points = []
+    mids = np.empty(steps)
+    invs = np.empty(steps, dtype=np.int64)
+    pnls = np.empty(steps)
     for t in range(steps):
         # random walk mid
         mid *= (1.0 + sigma * rng.standard_normal())
@@ -36,14 +41,112 @@ def simulate_market_making(steps=500, sigma=0.01, base_spread=0.02, inventory_li
 
         pnl = cash + inv * mid
 
-        points.append({
-            "t": t,
-            "mid": float(mid),
-            "inventory": int(inv),
-            "pnl": float(pnl),
+        mids[t] = mid
+        invs[t] = inv
+        pnls[t] = pnl
+
+    # columns are filled in the loop and encoded once at the end
+    points = pd.DataFrame({
+        "t": np.arange(steps, dtype=np.int64),
+        "mid": mids,
+        "inventory": invs,
+        "pnl": pnls,
+    })
+
+    return {
+        "final_pnl": round(float(pnls[-1]), 6) if steps > 0 else 0.0,
+        "points": encode_points(points, points_format),
+    }
+
+MAX_SWEEP_PATHS = 250_000
+SWEEP_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+def sweep_market_making(steps=500, sigmas=(0.01,), base_spreads=(0.02,), inventory_limits=(50,), n_seeds=100, seed=42):
+    # Same dynamics as simulate_market_making, stepped over time and vectorized
+    # across every (sigma, base_spread, inventory_limit, seed) path. Paths draw
+    # from one shared generator, so an individual path does not reproduce the
+    # single-run output for the same seed. Only summary statistics are kept.
+    sig_g, spr_g, lim_g = np.meshgrid(
+        np.asarray(sigmas, dtype=float),
+        np.asarray(base_spreads, dtype=float),
+        np.asarray(inventory_limits, dtype=np.int64),
+        indexing="ij",
+    )
+    n_combos = sig_g.size
+    n_seeds = int(n_seeds)
+    n_paths = n_combos * n_seeds
+    if n_combos == 0 or n_seeds < 1:
+        raise ValueError("Sweep needs at least one value per parameter and n_seeds >= 1")
+    if n_paths > MAX_SWEEP_PATHS:
+        raise ValueError(f"Sweep too large: {n_paths} paths (max {MAX_SWEEP_PATHS})")
+
+    # path p belongs to combo p // n_seeds
+    sigma = np.repeat(sig_g.ravel(), n_seeds)
+    base_spread = np.repeat(spr_g.ravel(), n_seeds)
+    limit = np.repeat(lim_g.ravel(), n_seeds)
+    limit_div = np.maximum(1, limit).astype(float)
+
+    rng = np.random.default_rng(seed)
+    mid = np.full(n_paths, 100.0)
+    cash = np.zeros(n_paths)
+    inv = np.zeros(n_paths, dtype=np.int64)
+    pnl = np.zeros(n_paths)
+    peak = np.zeros(n_paths)
+    max_dd = np.zeros(n_paths)
+    max_inv = np.zeros(n_paths, dtype=np.int64)
+
+    for _ in range(max(0, int(steps))):
+        mid *= 1.0 + sigma * rng.standard_normal(n_paths)
+
+        inv_skew = 0.0005 * inv
+        spread = base_spread * (1.0 + np.abs(inv) / limit_div)
+        bid = mid * (1.0 - spread / 2) - inv_skew
+        ask = mid * (1.0 + spread / 2) - inv_skew
+        fill_prob = np.maximum(0.05, 1.0 - spread * 10.0)
+
+        buy_side = rng.random(n_paths) < 0.5   # counterparty buys, we sell at ask
+        filled = rng.random(n_paths) < fill_prob
+        sell = filled & buy_side & (inv > -limit)
+        buy = filled & ~buy_side & (inv < limit)
+
+        cash += np.where(sell, ask, 0.0) - np.where(buy, bid, 0.0)
+        inv += buy.astype(np.int64) - sell.astype(np.int64)
+
+        pnl = cash + inv * mid
+        np.maximum(peak, pnl, out=peak)
+        np.maximum(max_dd, peak - pnl, out=max_dd)
+        np.maximum(max_inv, np.abs(inv), out=max_inv)
+
+    final = pnl.reshape(n_combos, n_seeds)
+    dd = max_dd.reshape(n_combos, n_seeds)
+    mi = max_inv.reshape(n_combos, n_seeds)
+    q_final = np.quantile(final, SWEEP_QUANTILES, axis=1)
+    q_dd = np.quantile(dd, SWEEP_QUANTILES, axis=1)
+
+    results = []
+    for c in range(n_combos):
+        results.append({
+            "sigma": float(sig_g.flat[c]),
+            "base_spread": float(spr_g.flat[c]),
+            "inventory_limit": int(lim_g.flat[c]),
+            "final_pnl": {
+                "mean": float(final[c].mean()),
+                "std": float(final[c].std()),
+                "quantiles": {str(q): float(v) for q, v in zip(SWEEP_QUANTILES, q_final[:, c])},
+            },
+            "max_drawdown": {
+                "mean": float(dd[c].mean()),
+                "quantiles": {str(q): float(v) for q, v in zip(SWEEP_QUANTILES, q_dd[:, c])},
+            },
+            "max_inventory": {
+                "mean": float(mi[c].mean()),
+                "max": int(mi[c].max()),
+            },
         })
 
     return {
-        "final_pnl": round(points[-1]["pnl"], 6) if points else 0.0,
-        "points": points,
+        "steps": int(steps),
+        "n_seeds": n_seeds,
+        "n_paths": int(n_paths),
+        "results": results,
     }
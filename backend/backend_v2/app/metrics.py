@@ -0,0 +1,190 @@
+from __future__ import annotations
+import os
+import math
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+# In-process metrics with Prometheus text exposition.
+#
+# Histograms and counters are plain dicts of label tuples guarded by one
+# lock each, so an observation is a bisect plus a few additions. `stage()`
+# times a named section of work into a shared per-stage histogram and, while
+# a request is being served with SERVER_TIMING=1, also records it for that
+# request's Server-Timing header (sync handlers run in the threadpool with a
+# copy of the request context, so the per-request list is shared). Gauges
+# that mirror existing stats (cache sizes, job counts) are filled by
+# collectors at scrape time instead of on the hot path.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+PREFIX = "alphaterminal_"
+
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = ['%s="%s"' % (n, _escape(v)) for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = PREFIX + name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+        _REGISTRY.append(self)
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out += [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+        return out
+
+class Gauge(Counter):
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def expose(self) -> List[str]:
+        out = super().expose()
+        out[1] = f"# TYPE {self.name} gauge"
+        return out
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=_BUCKETS):
+        self.name, self.help, self.labelnames = PREFIX + name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for k, s in items:
+            cum = 0
+            for b, c in zip(self.buckets, s):
+                cum += c
+                le = 'le="%s"' % _fmt(b)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {cum}")
+            inf = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, k, inf)} {s[-1]}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_fmt(s[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {s[-1]}")
+        return out
+
+_REGISTRY: List = []
+_COLLECTORS: List[Callable[[], None]] = []
+_timings: ContextVar[Optional[list]] = ContextVar("server_timing", default=None)
+
+HTTP_SECONDS = Histogram("http_request_duration_seconds", "Time until response headers, by route", ("method", "route", "status"))
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Duration of instrumented stages", ("stage",))
+PROVIDER_SECONDS = Histogram("provider_fetch_duration_seconds", "Price provider fetch latency", ("provider",))
+PROVIDER_REQUESTS = Counter("provider_requests_total", "Price provider fetch calls by outcome", ("provider", "outcome"))
+PROVIDER_FALLBACKS = Counter("provider_fallback_tickers_total", "Tickers served by a fallback source", ("source", "fallback"))
+MODEL_SECONDS = Histogram("model_fit_duration_seconds", "Model fit / inference time", ("model", "mode"))
+
+def register_collector(fn: Callable[[], None]) -> None:
+    _COLLECTORS.append(fn)
+
+def render() -> str:
+    for fn in _COLLECTORS:
+        try:
+            fn()
+        except Exception:
+            continue
+    lines: List[str] = []
+    for m in _REGISTRY:
+        lines += m.expose()
+    return "\n".join(lines) + "\n"
+
+def record_timing(name: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, name)
+        record_timing(name, dt)
+
+def observe_model(model: str, mode: str, seconds: float) -> None:
+    MODEL_SECONDS.observe(seconds, model, mode)
+    record_timing(f"{model}_{mode}", seconds)
+
+@contextmanager
+def model_timer(model: str, mode: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_model(model, mode, time.perf_counter() - t0)
+
+class MetricsMiddleware:
+    # Pure ASGI (no BaseHTTPMiddleware) so streaming responses pass through untouched.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        token = _timings.set([] if SERVER_TIMING else None)
+        timings = _timings.get()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                dt = time.perf_counter() - t0
+                route = scope.get("route")
+                HTTP_SECONDS.observe(dt, scope["method"], getattr(route, "path", "unmatched"), str(message["status"]))
+                if timings is not None:
+                    merged: Dict[str, float] = {}
+                    for n, secs in timings:
+                        merged[n] = merged.get(n, 0.0) + secs
+                    parts = [f"{n};dur={secs * 1000:.2f}" for n, secs in merged.items()] + [f"total;dur={dt * 1000:.2f}"]
+                    headers = list(message.get("headers", [])) + [(b"server-timing", ", ".join(parts).encode("latin-1"))]
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
@@ -1,49 +1,58 @@
 from __future__ import annotations
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.svm import SVC
 from sklearn.neural_network import MLPClassifier
 from sklearn.metrics import accuracy_score, f1_score, roc_auc_score, confusion_matrix
-from .data import get_price_df
-
-def _rsi(series: pd.Series, window=14) -> pd.Series:
-    delta = series.diff()
-    up = delta.clip(lower=0).rolling(window).mean()
-    down = (-delta.clip(upper=0)).rolling(window).mean()
-    rs = up / (down + 1e-12)
-    return 100 - (100 / (1 + rs))
-
-def _macd(series: pd.Series, fast=12, slow=26, signal=9):
-    ema_fast = series.ewm(span=fast, adjust=False).mean()
-    ema_slow = series.ewm(span=slow, adjust=False).mean()
-    macd = ema_fast - ema_slow
-    sig = macd.ewm(span=signal, adjust=False).mean()
-    return macd, sig, (macd - sig)
+from . import metrics, model_registry
+from .data import get_price_df, price_version
+from .features import FEATURES, ticker_features
 
-def ml_predict(ticker: str, model_name: str = "random_forest", horizon_days: int = 1, train_years: int = 3) -> dict:
-    period = f"{max(2, train_years + 1)}y"
-    close = get_price_df([ticker], period=period)[ticker].astype(float)
-
-    df = pd.DataFrame({"close": close})
-    df["ret1"] = np.log(df["close"]).diff()
-    df["ret2"] = df["ret1"].shift(1)
-    df["sma5"] = df["close"].rolling(5).mean()
-    df["sma20"] = df["close"].rolling(20).mean()
-    df["rsi14"] = _rsi(df["close"], 14)
-    macd, sig, hist = _macd(df["close"])
-    df["macd"] = macd
-    df["macd_signal"] = sig
-    df["macd_hist"] = hist
+# Predict with the newest registered model for a spec when none matches the
+# current data version, instead of retraining inline (see /api/ml/train),
+# as long as it was trained within the last ML_STALE_MAX_HOURS.
+ALLOW_STALE_MODELS = os.getenv("ML_ALLOW_STALE_MODELS", "1") == "1"
+STALE_MAX_SECONDS = float(os.getenv("ML_STALE_MAX_HOURS", "168")) * 3600
+
+def _canonical_model(model_name: str) -> str:
+    m = model_name.lower()
+    if m in ["svm", "svc"]:
+        return "svm"
+    if m in ["neural", "neural_net", "mlp"]:
+        return "mlp"
+    return "random_forest"
+
+def price_period(train_years: int) -> str:
+    return f"{max(2, int(train_years) + 1)}y"
+
+def _load_close(ticker: str, train_years: int) -> pd.Series:
+    return get_price_df([ticker], period=price_period(train_years))[ticker].astype(float)
+
+def _build_features(close: pd.Series, horizon_days: int) -> pd.DataFrame:
+    # indicators come from the shared incremental feature store
+    df = ticker_features(close.to_frame(close.name))[close.name]
+    df.insert(0, "close", close)
 
     # target: next horizon_days return up?
     df["future_ret"] = df["ret1"].shift(-horizon_days)
     df["y"] = (df["future_ret"] > 0).astype(int)
 
-    df = df.dropna().copy()
+    return df.dropna().copy()
 
-    features = ["ret1", "ret2", "sma5", "sma20", "rsi14", "macd", "macd_signal", "macd_hist"]
-    X = df[features].values
+def _new_estimator(model: str):
+    if model == "svm":
+        return SVC(kernel="rbf", probability=True)
+    if model == "mlp":
+        return MLPClassifier(hidden_layer_sizes=(32, 16), max_iter=500, random_state=42)
+    return RandomForestClassifier(n_estimators=300, random_state=42)
+
+def _train(model: str, df: pd.DataFrame, spec: str, version: str) -> tuple:
+    X = df[FEATURES].values
     y = df["y"].values
 
     # time split
@@ -51,14 +60,7 @@ def ml_predict(ticker: str, model_name: str = "random_forest", horizon_days: int
     X_train, X_test = X[:split], X[split:]
     y_train, y_test = y[:split], y[split:]
 
-    m = model_name.lower()
-    if m in ["svm", "svc"]:
-        clf = SVC(kernel="rbf", probability=True)
-    elif m in ["neural", "neural_net", "mlp"]:
-        clf = MLPClassifier(hidden_layer_sizes=(32, 16), max_iter=500, random_state=42)
-    else:
-        clf = RandomForestClassifier(n_estimators=300, random_state=42)
-
+    clf = _new_estimator(model)
     clf.fit(X_train, y_train)
     proba = clf.predict_proba(X_test)[:, 1]
     pred = (proba >= 0.5).astype(int)
@@ -68,24 +70,200 @@ def ml_predict(ticker: str, model_name: str = "random_forest", horizon_days: int
     auc = float(roc_auc_score(y_test, proba)) if len(set(y_test)) > 1 else None
     cm = confusion_matrix(y_test, pred).tolist()
 
+    meta = {
+        "accuracy": round(acc, 4),
+        "f1": round(f1, 4),
+        "auc": round(auc, 4) if auc is not None else None,
+        "confusion_matrix": cm,
+        "n_train": int(len(X_train)),
+        "n_test": int(len(X_test)),
+        "last_train_date": df.index[-1].strftime("%Y-%m-%d"),
+    }
+    # prediction for the newest row of this data version, so exact-version hits skip inference
+    meta["last_prob"] = float(clf.predict_proba(X[-1:])[:, 1][0])
+    if hasattr(clf, "feature_importances_"):
+        meta["feature_importances"] = {FEATURES[i]: float(clf.feature_importances_[i]) for i in range(len(FEATURES))}
+
+    meta = model_registry.save(spec, version, clf, meta)
+    return clf, meta
+
+def ml_train(ticker: str, model_name: str = "random_forest", horizon_days: int = 1, train_years: int = 3) -> dict:
+    # Train/refresh path: always fits on the current data and registers the model.
+    model = _canonical_model(model_name)
+    close = _load_close(ticker, train_years)
+    df = _build_features(close, horizon_days)
+    spec = model_registry.spec_key(ticker, model, horizon_days, train_years)
+    version = price_version(close.to_frame())
+    with metrics.model_timer(model, "train"):
+        _, meta = _train(model, df, spec, version)
+    meta = {k: v for k, v in meta.items() if k != "last_prob"}
+    return {"ticker": ticker, "model": model_name, "horizon_days": horizon_days, **meta}
+
+def ml_predict(ticker: str, model_name: str = "random_forest", horizon_days: int = 1, train_years: int = 3) -> dict:
+    model = _canonical_model(model_name)
+    close = _load_close(ticker, train_years)
+    spec = model_registry.spec_key(ticker, model, horizon_days, train_years)
+    version = price_version(close.to_frame())
+
+    loaded = model_registry.load(spec, version)
+    if loaded is None and ALLOW_STALE_MODELS:
+        latest = model_registry.latest_version(spec)
+        loaded = model_registry.load(spec, latest) if latest else None
+        if loaded is not None and time.time() - float(loaded[1].get("trained_at", 0)) > STALE_MAX_SECONDS:
+            loaded = None  # too old to serve; retrain on current data
+
+    df = _build_features(close, horizon_days)
+    if loaded is None:
+        with metrics.model_timer(model, "train"):
+            clf, meta = _train(model, df, spec, version)
+    else:
+        clf, meta = loaded
+
     # latest
-    last_x = X[-1:].copy()
-    last_prob = float(clf.predict_proba(last_x)[:, 1][0])
+    if meta["data_version"] == version and "last_prob" in meta:
+        last_prob = float(meta["last_prob"])
+    else:
+        X = df[FEATURES].values
+        last_x = X[-1:].copy()
+        with metrics.model_timer(model, "predict"):
+            last_prob = float(clf.predict_proba(last_x)[:, 1][0])
     last_pred = int(last_prob >= 0.5)
 
     out = {
         "ticker": ticker,
         "model": model_name,
         "horizon_days": horizon_days,
-        "accuracy": round(acc, 4),
-        "f1": round(f1, 4),
-        "auc": round(auc, 4) if auc is not None else None,
-        "confusion_matrix": cm,
+        "accuracy": meta["accuracy"],
+        "f1": meta["f1"],
+        "auc": meta["auc"],
+        "confusion_matrix": meta["confusion_matrix"],
         "prob_up": round(last_prob, 4),
         "prediction": "UP" if last_pred == 1 else "DOWN",
+        "model_version": meta["data_version"],
+        "stale_model": meta["data_version"] != version,
     }
 
-    if hasattr(clf, "feature_importances_"):
-        out["feature_importances"] = {features[i]: float(clf.feature_importances_[i]) for i in range(len(features))}
+    if "feature_importances" in meta:
+        out["feature_importances"] = meta["feature_importances"]
 
     return out
+
+# ---- walk-forward evaluation ----
+# Folds run in a process pool. The feature matrix and labels are placed in
+# shared memory once; workers attach to them by name in their initializer,
+# so each fold only ships four row offsets instead of a pickled copy. With a
+# single worker the folds run in the calling thread on the arrays directly.
+# Every call starts its own pool, so concurrent requests multiply it; the
+# default stays small and ML_WF_WORKERS raises it on dedicated hosts.
+WF_WORKERS = int(os.getenv("ML_WF_WORKERS", str(min(2, os.cpu_count() or 1))))
+
+_wf_state: dict = {}
+
+def _wf_init(x_name: str, x_shape: tuple, y_name: str, y_shape: tuple, model: str) -> None:
+    shm_x = shared_memory.SharedMemory(name=x_name)
+    shm_y = shared_memory.SharedMemory(name=y_name)
+    _wf_state.update(
+        shm=(shm_x, shm_y),
+        X=np.ndarray(x_shape, dtype=np.float64, buffer=shm_x.buf),
+        y=np.ndarray(y_shape, dtype=np.int64, buffer=shm_y.buf),
+        model=model,
+    )
+
+def _wf_fold(tr0: int, tr1: int, te0: int, te1: int) -> dict:
+    # process-pool entry point; the arrays come from the worker's shared memory
+    return _fit_fold(_wf_state["X"], _wf_state["y"], _wf_state["model"], tr0, tr1, te0, te1)
+
+def _fit_fold(X: np.ndarray, y: np.ndarray, model: str, tr0: int, tr1: int, te0: int, te1: int) -> dict:
+    classes = np.unique(y[tr0:tr1])
+    if len(classes) < 2:
+        # a one-class training window can only predict that class
+        proba = np.full(te1 - te0, float(classes[0]) if len(classes) else 0.5)
+    else:
+        clf = _new_estimator(model)
+        clf.fit(X[tr0:tr1], y[tr0:tr1])
+        proba = clf.predict_proba(X[te0:te1])[:, 1]
+    pred = (proba >= 0.5).astype(int)
+    y_test = y[te0:te1]
+    return {
+        "accuracy": float(accuracy_score(y_test, pred)),
+        "f1": float(f1_score(y_test, pred, zero_division=0)),
+        "auc": float(roc_auc_score(y_test, proba)) if len(set(y_test)) > 1 else None,
+        "n_test": int(len(y_test)),
+        "n_correct": int((pred == y_test).sum()),
+    }
+
+def _summary(values: list) -> dict:
+    vals = [v for v in values if v is not None]
+    if not vals:
+        return {"mean": None, "std": None}
+    return {"mean": round(float(np.mean(vals)), 4), "std": round(float(np.std(vals)), 4)}
+
+def ml_walk_forward(ticker: str, model_name: str = "random_forest", horizon_days: int = 1, train_years: int = 3,
+                    train_window: int = 500, test_window: int = 21, step: int = 21, max_folds: int = 50,
+                    workers: int | None = None) -> dict:
+    # Rolling-origin backtest: fixed-length training windows ending
+    # `horizon_days` bars before each test block (so labels do not overlap
+    # the test period), advancing by `step`; the last `max_folds` folds are kept.
+    model = _canonical_model(model_name)
+    close = _load_close(ticker, train_years)
+    df = _build_features(close, horizon_days)
+    X = np.ascontiguousarray(df[FEATURES].to_numpy(dtype=np.float64))
+    y = np.ascontiguousarray(df["y"].to_numpy(dtype=np.int64))
+    n = len(df)
+
+    folds = []
+    te0 = train_window + horizon_days
+    while te0 < n:
+        te1 = min(te0 + test_window, n)
+        folds.append((te0 - horizon_days - train_window, te0 - horizon_days, te0, te1))
+        te0 += step
+    folds = folds[-max_folds:]
+    if not folds:
+        raise ValueError(f"Not enough history for train_window={train_window} ({n} rows)")
+
+    workers = min(WF_WORKERS if workers is None else workers, len(folds))
+    if workers > 1:
+        shm_x = shared_memory.SharedMemory(create=True, size=max(1, X.nbytes))
+        shm_y = shared_memory.SharedMemory(create=True, size=max(1, y.nbytes))
+        try:
+            np.ndarray(X.shape, dtype=X.dtype, buffer=shm_x.buf)[:] = X
+            np.ndarray(y.shape, dtype=y.dtype, buffer=shm_y.buf)[:] = y
+            init_args = (shm_x.name, X.shape, shm_y.name, y.shape, model)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_wf_init, initargs=init_args) as pool:
+                results = list(pool.map(_wf_fold, *zip(*folds)))
+        finally:
+            for shm in (shm_x, shm_y):
+                shm.close()
+                shm.unlink()
+    else:
+        results = [_fit_fold(X, y, model, *f) for f in folds]
+
+    dates = df.index.strftime("%Y-%m-%d")
+    per_fold = []
+    for i, ((tr0, tr1, te0, te1), res) in enumerate(zip(folds, results)):
+        per_fold.append({
+            "fold": i,
+            "train_start": dates[tr0],
+            "train_end": dates[tr1 - 1],
+            "test_start": dates[te0],
+            "test_end": dates[te1 - 1],
+            **{k: (round(v, 4) if isinstance(v, float) else v) for k, v in res.items()},
+        })
+
+    total = sum(r["n_test"] for r in results)
+    return {
+        "ticker": ticker,
+        "model": model_name,
+        "horizon_days": horizon_days,
+        "train_window": train_window,
+        "test_window": test_window,
+        "step": step,
+        "n_folds": len(folds),
+        "aggregate": {
+            "accuracy": _summary([r["accuracy"] for r in results]),
+            "f1": _summary([r["f1"] for r in results]),
+            "auc": _summary([r["auc"] for r in results]),
+            "pooled_accuracy": round(sum(r["n_correct"] for r in results) / total, 4) if total else None,
+        },
+        "folds": per_fold,
+    }
@@ -0,0 +1,125 @@
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import pickle
+import threading
+from typing import Any, Optional, Tuple
+
+from .cache import TTLCache
+
+# On-disk registry of fitted estimators.
+#
+# Layout: <root>/<spec>/<data_version>.pkl + .json, where spec encodes
+# ticker/model/horizon/train_years and the JSON sidecar carries metrics and
+# training metadata. The total size is bounded (ML_REGISTRY_MAX_MB); the
+# least recently used artifacts (by mtime, refreshed on load) are evicted.
+# Loaded estimators are also kept in memory so repeat predictions skip unpickling.
+REGISTRY_DIR = os.getenv("ML_REGISTRY_DIR", os.path.join(".cache", "models"))
+REGISTRY_MAX_BYTES = int(float(os.getenv("ML_REGISTRY_MAX_MB", "512")) * 1024 * 1024)
+
+_loaded = TTLCache(
+    max_bytes=int(float(os.getenv("ML_REGISTRY_MEMORY_MB", "256")) * 1024 * 1024),
+    ttl_seconds=24 * 3600,
+    sizer=lambda entry: entry[2],
+)
+_write_lock = threading.Lock()
+
+def spec_key(ticker: str, model: str, horizon_days: int, train_years: int) -> str:
+    safe = re.sub(r"[^A-Za-z0-9._^=-]", "_", ticker.upper())
+    return f"{safe}__{model}__h{int(horizon_days)}__y{int(train_years)}"
+
+def _paths(spec: str, version: str) -> Tuple[str, str]:
+    base = os.path.join(REGISTRY_DIR, spec, version)
+    return base + ".pkl", base + ".json"
+
+def save(spec: str, version: str, estimator: Any, meta: dict) -> dict:
+    pkl, js = _paths(spec, version)
+    meta = dict(meta, spec=spec, data_version=version, trained_at=time.time())
+    with _write_lock:
+        os.makedirs(os.path.dirname(pkl), exist_ok=True)
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp = f"{pkl}.{suffix}"
+        with open(tmp, "wb") as f:
+            pickle.dump(estimator, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, pkl)
+        tmp = f"{js}.{suffix}"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, js)
+        _evict()
+    _loaded.set((spec, version), (estimator, meta, os.path.getsize(pkl)))
+    return meta
+
+def load(spec: str, version: str) -> Optional[Tuple[Any, dict]]:
+    hit = _loaded.get((spec, version))
+    if hit is not None:
+        return hit[0], hit[1]
+    pkl, js = _paths(spec, version)
+    try:
+        with open(js, "r") as f:
+            meta = json.load(f)
+        with open(pkl, "rb") as f:
+            estimator = pickle.load(f)
+        os.utime(pkl)
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+        return None
+    _loaded.set((spec, version), (estimator, meta, os.path.getsize(pkl)))
+    return estimator, meta
+
+def latest_version(spec: str) -> Optional[str]:
+    d = os.path.join(REGISTRY_DIR, spec)
+    best, best_t = None, -1.0
+    try:
+        names = os.listdir(d)
+    except OSError:
+        return None
+    for name in names:
+        if not name.endswith(".json") or not os.path.exists(os.path.join(d, name[:-5] + ".pkl")):
+            continue
+        try:
+            with open(os.path.join(d, name), "r") as f:
+                t = float(json.load(f).get("trained_at", 0))
+        except (OSError, ValueError):
+            continue
+        if t > best_t:
+            best, best_t = name[:-5], t
+    return best
+
+def _evict() -> None:
+    entries, total = [], 0
+    for root, _, files in os.walk(REGISTRY_DIR):
+        for name in files:
+            if name.endswith(".pkl"):
+                p = os.path.join(root, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+    entries.sort()
+    for _, size, p in entries:
+        if total <= REGISTRY_MAX_BYTES:
+            break
+        for path in (p, p[:-4] + ".json"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        spec, version = os.path.basename(os.path.dirname(p)), os.path.basename(p)[:-4]
+        _loaded.pop((spec, version))
+        total -= size
+
+def stats() -> dict:
+    n, total = 0, 0
+    for root, _, files in os.walk(REGISTRY_DIR):
+        for name in files:
+            if name.endswith(".pkl"):
+                n += 1
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return {"models": n, "bytes": total, "max_bytes": REGISTRY_MAX_BYTES, "memory": _loaded.stats()}
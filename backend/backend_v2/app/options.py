@@ -1,6 +1,8 @@
 from __future__ import annotations
 import math
 from dataclasses import dataclass
+import numpy as np
+from scipy.special import ndtr
 from scipy.stats import norm
 
 @dataclass
@@ -18,3 +20,173 @@ def black_scholes(S: float, K: float, T: float, r: float, sigma: float) -> Black
     call = S * norm.cdf(d1) - K * math.exp(-r * T) * norm.cdf(d2)
     put = K * math.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
     return BlackScholesResult(call=call, put=put, d1=d1, d2=d2)
+
+def option_price(S: float, K: float, T: float, r: float, sigma: float) -> dict:
+    res = black_scholes(S, K, T, r, sigma)
+    return {"call": round(res.call, 6), "put": round(res.put, 6), "d1": round(res.d1, 6), "d2": round(res.d2, 6)}
+
+@dataclass
+class BlackScholesChain:
+    call: np.ndarray
+    put: np.ndarray
+    d1: np.ndarray
+    d2: np.ndarray
+    delta_call: np.ndarray
+    delta_put: np.ndarray
+    gamma: np.ndarray
+    vega: np.ndarray
+    theta_call: np.ndarray
+    theta_put: np.ndarray
+    rho_call: np.ndarray
+    rho_put: np.ndarray
+
+_INV_SQRT_2PI = 1.0 / math.sqrt(2.0 * math.pi)
+
+def black_scholes_chain(S, K, T, r, sigma, dtype=np.float64) -> BlackScholesChain:
+    # Vectorized pricing + Greeks for whole chains; inputs broadcast against
+    # each other. Greeks are raw derivatives: vega per 1.0 vol, theta per year,
+    # rho per 1.0 rate.
+    S, K, T, r, sigma = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (S, K, T, r, sigma)))
+    if (T <= 0).any() or (sigma <= 0).any() or (S <= 0).any() or (K <= 0).any():
+        raise ValueError("Invalid inputs: require S,K,T,sigma > 0")
+
+    sqrt_t = np.sqrt(T)
+    vol_t = sigma * sqrt_t
+    d1 = (np.log(S / K) + (r + 0.5 * sigma * sigma) * T) / vol_t
+    d2 = d1 - vol_t
+    disc_k = K * np.exp(-r * T)
+    nd1 = ndtr(d1)
+    nd2 = ndtr(d2)
+    # N(-x) evaluated directly rather than 1 - N(x) to keep deep OTM puts accurate
+    nmd1 = ndtr(-d1)
+    nmd2 = ndtr(-d2)
+    pdf_d1 = _INV_SQRT_2PI * np.exp(-0.5 * d1 * d1)
+
+    decay = -S * pdf_d1 * sigma / (2.0 * sqrt_t)
+    out = BlackScholesChain(
+        call=S * nd1 - disc_k * nd2,
+        put=disc_k * nmd2 - S * nmd1,
+        d1=d1,
+        d2=d2,
+        delta_call=nd1,
+        delta_put=-nmd1,
+        gamma=pdf_d1 / (S * vol_t),
+        vega=S * pdf_d1 * sqrt_t,
+        theta_call=decay - r * disc_k * nd2,
+        theta_put=decay + r * disc_k * nmd2,
+        rho_call=T * disc_k * nd2,
+        rho_put=-T * disc_k * nmd2,
+    )
+    if np.dtype(dtype) != np.float64:
+        out = BlackScholesChain(**{k: v.astype(dtype) for k, v in out.__dict__.items()})
+    return out
+
+def black_scholes_grid(S: float, strikes, expiries, r: float, sigma, dtype=np.float64) -> BlackScholesChain:
+    # strike x expiry grid: rows are strikes, columns are expiries
+    K = np.asarray(strikes, dtype=np.float64)[:, None]
+    T = np.asarray(expiries, dtype=np.float64)[None, :]
+    return black_scholes_chain(S, K, T, r, sigma, dtype=dtype)
+
+@dataclass
+class ImpliedVolResult:
+    iv: np.ndarray
+    converged: np.ndarray
+    iterations: int
+
+def _bs_price_vega(S, K, T, r, sigma, is_call):
+    sqrt_t = np.sqrt(T)
+    vol_t = sigma * sqrt_t
+    d1 = (np.log(S / K) + (r + 0.5 * sigma * sigma) * T) / vol_t
+    d2 = d1 - vol_t
+    disc_k = K * np.exp(-r * T)
+    call = S * ndtr(d1) - disc_k * ndtr(d2)
+    put = disc_k * ndtr(-d2) - S * ndtr(-d1)
+    vega = S * _INV_SQRT_2PI * np.exp(-0.5 * d1 * d1) * sqrt_t
+    return np.where(is_call, call, put), vega
+
+def implied_volatility(price, S, K, T, r, is_call=True, tol=1e-10, max_iter=100,
+                       lo=1e-6, hi=10.0) -> ImpliedVolResult:
+    # Safeguarded Newton: each element keeps a [lo, hi] bracket (price is
+    # increasing in sigma); Newton steps that leave the bracket fall back to
+    # bisection. Converged elements drop out of the working set each iteration.
+    price, S, K, T, r, is_call = np.broadcast_arrays(
+        *(np.asarray(x, dtype=np.float64) for x in (price, S, K, T, r)), np.asarray(is_call, dtype=bool)
+    )
+    shape = price.shape
+    price, S, K, T, r, is_call = (a.ravel() for a in (price, S, K, T, r, is_call))
+    n = price.size
+
+    iv = np.full(n, np.nan)
+    converged = np.zeros(n, dtype=bool)
+
+    valid = (S > 0) & (K > 0) & (T > 0) & np.isfinite(price)
+    disc_k = np.where(valid, K * np.exp(-r * T), np.nan)
+    intrinsic = np.where(is_call, np.maximum(S - disc_k, 0.0), np.maximum(disc_k - S, 0.0))
+    upper = np.where(is_call, S, disc_k)
+    with np.errstate(invalid="ignore"):
+        valid &= (price > intrinsic) & (price < upper)
+
+    act = np.flatnonzero(valid)
+    # Brenner-Subrahmanyam starting point
+    sig = np.clip(np.sqrt(2.0 * np.pi / T[act]) * price[act] / S[act], 0.01, 3.0)
+    a = np.full(act.size, lo)
+    b = np.full(act.size, hi)
+    last = np.full(act.size, hi - lo)
+
+    it = 0
+    while act.size and it < max_iter:
+        it += 1
+        model, vega = _bs_price_vega(S[act], K[act], T[act], r[act], sig, is_call[act])
+        diff = model - price[act]
+
+        # converged once the Newton step (diff / vega) or the bracket is below tol in vol units
+        done = (np.abs(diff) < tol * vega) | (b - a < tol)
+        iv[act[done]] = sig[done]
+        converged[act[done]] = True
+
+        keep = ~done
+        act, sig, a, b, diff, vega, last = act[keep], sig[keep], a[keep], b[keep], diff[keep], vega[keep], last[keep]
+        a = np.where(diff < 0, sig, a)
+        b = np.where(diff > 0, sig, b)
+        # tiny vega (deep ITM/OTM) can overflow the step; the bracket check below catches it
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            step = sig - diff / vega
+        # also bisect when Newton is not at least halving the previous step (rtsafe rule)
+        bisect = ~np.isfinite(step) | (step <= a) | (step >= b) | (np.abs(step - sig) > 0.5 * last)
+        new_sig = np.where(bisect, 0.5 * (a + b), step)
+        last = np.abs(new_sig - sig)
+        sig = new_sig
+
+    return ImpliedVolResult(iv=iv.reshape(shape), converged=converged.reshape(shape), iterations=it)
+
+def implied_vol_surface(S: float, strikes, expiries, prices, r: float = 0.0, is_call=True, tol=1e-10) -> dict:
+    # Flat quotes (strike, expiry, price, type) -> strike x expiry IV grid.
+    # Cells quoted more than once (e.g. call and put) average their converged IVs.
+    K = np.asarray(strikes, dtype=np.float64).ravel()
+    T = np.asarray(expiries, dtype=np.float64).ravel()
+    P = np.asarray(prices, dtype=np.float64).ravel()
+    if not (K.size == T.size == P.size):
+        raise ValueError("strikes, expiries and prices must have the same length")
+    if K.size == 0:
+        raise ValueError("No quotes provided")
+
+    res = implied_volatility(P, S, K, T, r, is_call=is_call, tol=tol)
+    k_axis, ki = np.unique(K, return_inverse=True)
+    t_axis, ti = np.unique(T, return_inverse=True)
+
+    ok = res.converged
+    sums = np.zeros((k_axis.size, t_axis.size))
+    counts = np.zeros_like(sums)
+    np.add.at(sums, (ki[ok], ti[ok]), res.iv[ok])
+    np.add.at(counts, (ki[ok], ti[ok]), 1.0)
+    with np.errstate(invalid="ignore"):
+        grid = sums / counts
+
+    return {
+        "strikes": k_axis,
+        "expiries": t_axis,
+        "iv": grid,
+        "quote_iv": res.iv,
+        "failed": np.flatnonzero(~ok),
+        "iterations": res.iterations,
+    }
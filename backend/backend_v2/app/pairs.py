@@ -3,12 +3,72 @@ import numpy as np
 import pandas as pd
 import statsmodels.api as sm
 from statsmodels.tsa.stattools import coint
-from .data import get_price_df
+from .data import bars_per_year, date_labels, get_price_df, normalize_interval
+from .encoding import downsample, encode_points
 
-def pairs_analyze(ticker1: str, ticker2: str, period="1y", window=30) -> dict:
-    prices = get_price_df([ticker1, ticker2], period=period)
+def ols_hedge_ratio(log1: pd.Series, log2: pd.Series) -> float:
+    # Hedge ratio via OLS: log1 ~ a + b*log2
+    X = sm.add_constant(log2.values)
+    model = sm.OLS(log1.values, X).fit()
+    return float(model.params[1])
+
+def kalman_hedge(y, x, delta=1e-4, obs_var=1e-3) -> dict:
+    # Recursive hedge ratio: state [beta, alpha] follows a random walk with
+    # covariance delta/(1-delta) * I, observed through y_t = beta*x_t + alpha + e.
+    # y, x are (T,) or (T, P) for P pairs at once; the 2x2 state covariance
+    # is carried as three arrays so every step is elementwise across pairs.
+    # Returns filtered beta/alpha, the one-step forecast error (spread) and
+    # its standardized value (z). Steps with a NaN input are skipped.
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    squeeze = y.ndim == 1
+    if squeeze:
+        y, x = y[:, None], x[:, None]
+    T, P = y.shape
+    q = delta / (1.0 - delta)
+
+    b, a = np.zeros(P), np.zeros(P)
+    p11, p12, p22 = np.zeros(P), np.zeros(P), np.zeros(P)
+    out = {k: np.full((T, P), np.nan) for k in ("beta", "alpha", "spread", "z")}
+    for t in range(T):
+        xt, yt = x[t], y[t]
+        ok = np.isfinite(xt) & np.isfinite(yt)
+        r11, r12, r22 = p11 + q, p12, p22 + q
+        xt = np.where(ok, xt, 0.0)
+        Q = xt * xt * r11 + 2.0 * xt * r12 + r22 + obs_var
+        e = np.where(ok, yt - (b * xt + a), 0.0)
+        k1 = (r11 * xt + r12) / Q
+        k2 = (r12 * xt + r22) / Q
+        b = np.where(ok, b + k1 * e, b)
+        a = np.where(ok, a + k2 * e, a)
+        p11 = np.where(ok, r11 - k1 * k1 * Q, r11)
+        p12 = np.where(ok, r12 - k1 * k2 * Q, r12)
+        p22 = np.where(ok, r22 - k2 * k2 * Q, r22)
+        out["beta"][t] = np.where(ok, b, np.nan)
+        out["alpha"][t] = np.where(ok, a, np.nan)
+        out["spread"][t] = np.where(ok, e, np.nan)
+        out["z"][t] = np.where(ok, e / np.sqrt(Q), np.nan)
+
+    if squeeze:
+        out = {k: v[:, 0] for k, v in out.items()}
+    return out
+
+def pairs_analyze(ticker1: str, ticker2: str, period="1y", window=30, points_format="records",
+                  hedge="ols", kalman_delta=1e-4, kalman_obs_var=1e-3, interval="1d", max_points=None) -> dict:
+    prices = get_price_df([ticker1, ticker2], period=period, interval=interval)
+    return analyze_pair_prices(prices, ticker1, ticker2, window=window, points_format=points_format,
+                               hedge=hedge, kalman_delta=kalman_delta, kalman_obs_var=kalman_obs_var,
+                               interval=interval, max_points=max_points)
+
+def analyze_pair_prices(prices: pd.DataFrame, ticker1: str, ticker2: str, window=30, points_format="records",
+                        hedge="ols", kalman_delta=1e-4, kalman_obs_var=1e-3, interval="1d", max_points=None) -> dict:
+    # Same analysis on an already-loaded frame (used by the research screener)
+    interval = normalize_interval(interval)
     if ticker1 not in prices.columns or ticker2 not in prices.columns:
         raise ValueError("Missing data for one or both tickers")
+    mode = (hedge or "ols").lower()
+    if mode not in ("ols", "kalman"):
+        raise ValueError("hedge must be 'ols' or 'kalman'")
 
     p1 = prices[ticker1].astype(float)
     p2 = prices[ticker2].astype(float)
@@ -16,30 +76,39 @@ def pairs_analyze(ticker1: str, ticker2: str, period="1y", window=30) -> dict:
     log1 = np.log(p1)
     log2 = np.log(p2)
 
-    # Hedge ratio via OLS: log1 ~ a + b*log2
-    X = sm.add_constant(log2.values)
-    model = sm.OLS(log1.values, X).fit()
-    hedge_ratio = float(model.params[1])
+    # Cointegration p-value
+    _, pvalue, _ = coint(log1, log2)
 
-    spread = log1 - hedge_ratio * log2
+    if mode == "kalman":
+        kf = kalman_hedge(log1.values, log2.values, delta=kalman_delta, obs_var=kalman_obs_var)
+        z = pd.Series(kf["z"], index=log1.index)
+        z.iloc[:window] = np.nan  # filter burn-in
+        spread = pd.Series(kf["spread"], index=log1.index)
+        beta = kf["beta"]
+        hedge_ratio = float(beta[-1])
+    else:
+        hedge_ratio = ols_hedge_ratio(log1, log2)
 
-    roll_mean = spread.rolling(window).mean()
-    roll_std = spread.rolling(window).std(ddof=0)
-    z = (spread - roll_mean) / roll_std
-    z = z.replace([np.inf, -np.inf], np.nan)
+        spread = log1 - hedge_ratio * log2
 
-    # Cointegration p-value
-    _, pvalue, _ = coint(log1, log2)
+        roll_mean = spread.rolling(window).mean()
+        roll_std = spread.rolling(window).std(ddof=0)
+        z = (spread - roll_mean) / roll_std
+        z = z.replace([np.inf, -np.inf], np.nan)
 
-    out = pd.DataFrame({
-        "date": spread.index.strftime("%Y-%m-%d"),
+    cols = {
+        "date": date_labels(spread.index, interval),
         "spread": spread.values,
         "z": z.values,
-        "price1": p1.values,
-        "price2": p2.values,
-    }).dropna(subset=["z"])
+    }
+    if mode == "kalman":
+        cols["beta"] = beta
+    cols["price1"] = p1.values
+    cols["price2"] = p2.values
+    out = pd.DataFrame(cols).dropna(subset=["z"])
 
-    points = out.tail(252).to_dict(orient="records")  # keep it light
+    # last year of bars, thinned to the point budget
+    points = encode_points(downsample(out.tail(int(bars_per_year(interval))), max_points, y="z"), points_format)
 
     last_z = float(out["z"].iloc[-1]) if len(out) else None
 
@@ -48,6 +117,8 @@ def pairs_analyze(ticker1: str, ticker2: str, period="1y", window=30) -> dict:
         "ticker2": ticker2,
         "pvalue": float(pvalue),
         "hedge_ratio": hedge_ratio,
+        "hedge": mode,
+        "interval": interval,
         "last_z": last_z,
         "points": points,
     }
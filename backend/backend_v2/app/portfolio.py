@@ -1,10 +1,23 @@
 from __future__ import annotations
-from typing import List
+import os
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
 from pypfopt import expected_returns, risk_models
 from pypfopt.efficient_frontier import EfficientFrontier
-from .data import get_price_df
+from pypfopt.exceptions import OptimizationError
 
-def optimize_portfolio(tickers: List[str], period="2y", risk_free_rate=0.02) -> dict:
+from .cache import TTLCache
+from .data import get_price_df, price_version
+
+# Annualized moment estimates keyed by (ticker set, period, data version), so
+# repeat optimizations and frontier sweeps over unchanged prices skip the
+# return/covariance pass. A new bar changes the version and misses naturally.
+_MOMENTS = TTLCache(max_bytes=32 * 1024 * 1024, ttl_seconds=float(os.getenv("PORTFOLIO_MOMENTS_TTL", "86400")))
+FRONTIER_MAX_POINTS = 200
+
+def _moments(tickers: List[str], period: str) -> Tuple[pd.Series, pd.DataFrame, str]:
     if not tickers or len(tickers) < 2:
         raise ValueError("Provide at least 2 tickers")
 
@@ -12,18 +25,69 @@ def optimize_portfolio(tickers: List[str], period="2y", risk_free_rate=0.02) ->
     if prices.shape[1] < 2:
         raise ValueError("Not enough valid tickers with data")
 
-    mu = expected_returns.mean_historical_return(prices, frequency=252)
-    S = risk_models.sample_cov(prices, frequency=252)
+    version = price_version(prices)
+    key = (tuple(prices.columns), period, version)
 
-    ef = EfficientFrontier(mu, S)
-    ef.max_sharpe(risk_free_rate=risk_free_rate)
+    def load():
+        mu = expected_returns.mean_historical_return(prices, frequency=252)
+        S = risk_models.sample_cov(prices, frequency=252)
+        return mu, S
 
-    weights = ef.clean_weights()
-    exp_ret, vol, sharpe = ef.portfolio_performance(verbose=False, risk_free_rate=risk_free_rate)
+    mu, S = _MOMENTS.get_or_load(key, load)
+    return mu, S, version
 
+def _point(ef: EfficientFrontier, risk_free_rate: float) -> dict:
+    exp_ret, vol, sharpe = ef.portfolio_performance(verbose=False, risk_free_rate=risk_free_rate)
     return {
-        "weights": weights,
+        "weights": ef.clean_weights(),
         "expected_return": round(exp_ret * 100, 4),
         "volatility": round(vol * 100, 4),
         "sharpe": round(sharpe, 4),
     }
+
+def optimize_portfolio(tickers: List[str], period="2y", risk_free_rate=0.02) -> dict:
+    mu, S, _ = _moments(tickers, period)
+
+    ef = EfficientFrontier(mu, S)
+    ef.max_sharpe(risk_free_rate=risk_free_rate)
+
+    return _point(ef, risk_free_rate)
+
+def efficient_frontier(tickers: List[str], period="2y", n_points=25, risk_free_rate=0.02) -> dict:
+    # Min-vol, max-Sharpe and n_points target-return portfolios spanning
+    # [min-vol return, max attainable return]. The target sweep reuses one
+    # optimizer: pypfopt only updates the cvxpy target_return parameter, so
+    # the problem is compiled once and each solve warm-starts from the last.
+    if not 2 <= n_points <= FRONTIER_MAX_POINTS:
+        raise ValueError(f"n_points must be between 2 and {FRONTIER_MAX_POINTS}")
+    mu, S, version = _moments(tickers, period)
+
+    ef = EfficientFrontier(mu, S)
+    ef.min_volatility()
+    min_vol = _point(ef, risk_free_rate)
+
+    try:
+        ef = EfficientFrontier(mu, S)
+        ef.max_sharpe(risk_free_rate=risk_free_rate)
+        max_sharpe = _point(ef, risk_free_rate)
+    except (OptimizationError, ValueError):
+        max_sharpe = None  # no asset beats the risk-free rate
+
+    lo = min_vol["expected_return"] / 100
+    hi = float(mu.max())
+    points = []
+    ef = EfficientFrontier(mu, S)
+    for target in np.linspace(lo, hi - 1e-6 * max(1.0, abs(hi)), n_points):
+        try:
+            ef.efficient_return(float(target))
+        except (OptimizationError, ValueError):
+            continue
+        points.append(_point(ef, risk_free_rate))
+
+    return {
+        "tickers": list(mu.index),
+        "data_version": version,
+        "min_volatility": min_vol,
+        "max_sharpe": max_sharpe,
+        "frontier": points,
+    }
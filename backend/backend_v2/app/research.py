@@ -2,9 +2,11 @@ from __future__ import annotations
 import numpy as np
 import pandas as pd
 from .data import get_price_df
-from .pairs import pairs_analyze
+from .pairs import analyze_pair_prices
+from .screener import screen_pairs
 
 DEFAULT_UNIVERSE = ["AAPL", "MSFT", "GOOG", "GOOGL", "AMZN", "META", "NVDA", "TSLA"]
+RESEARCH_TOP_K = 5
 
 def replicate(paper_id: str, tickers=None) -> dict:
     pid = (paper_id or "").lower().strip()
@@ -12,21 +14,27 @@ def replicate(paper_id: str, tickers=None) -> dict:
 
     if pid in ["gatev_2006_pairs_trading", "gatev2006", "pairs_trading_gatev"]:
         # Lightweight “replication-like” demo:
-        # pick best pair (min p-value) among universe and run our analyzer
+        # load the universe once, screen all pairs in batch, then run the
+        # full analyzer (exact coint p-value) on the top candidates only
+        prices = get_price_df(universe, period="2y")
+        try:
+            screen = screen_pairs(universe, top_k=RESEARCH_TOP_K, prices=prices)
+        except ValueError as e:
+            return {"paper_id": paper_id, "status": "failed", "reason": str(e)}
+
         best = None
         best_p = 1.0
 
-        for i in range(len(universe)):
-            for j in range(i+1, len(universe)):
-                t1, t2 = universe[i], universe[j]
-                try:
-                    res = pairs_analyze(t1, t2, period="2y", window=30)
-                    p = float(res["pvalue"])
-                    if p < best_p:
-                        best_p = p
-                        best = res
-                except Exception:
-                    continue
+        for cand in screen["top"]:
+            t1, t2 = cand["ticker1"], cand["ticker2"]
+            try:
+                res = analyze_pair_prices(prices[[t1, t2]].dropna(), t1, t2, window=30)
+                p = float(res["pvalue"])
+                if p < best_p:
+                    best_p = p
+                    best = res
+            except Exception:
+                continue
 
         if not best:
             return {"paper_id": paper_id, "status": "failed", "reason": "Could not evaluate any pairs."}
@@ -38,6 +46,8 @@ def replicate(paper_id: str, tickers=None) -> dict:
             "selected_pair": [best["ticker1"], best["ticker2"]],
             "cointegration_pvalue": best["pvalue"],
             "hedge_ratio": best["hedge_ratio"],
+            "pairs_screened": screen["n_pairs"],
+            "candidates": screen["top"],
             "note": "This is a compact replication-style demo: select best cointegrated pair in a small universe and output spread/z-score series.",
             "result": best,
         }
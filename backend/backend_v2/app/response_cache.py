@@ -0,0 +1,156 @@
+from __future__ import annotations
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from .cache import TTLCache
+from .data import get_price_df, price_version
+from .encoding import json_response, render
+
+# Response cache for read-mostly analytics endpoints.
+#
+# The key is the route, its normalized parameters, the points format and a
+# data-version token of the prices the response is computed from, so a new
+# or revised bar changes the key and nothing has to be invalidated. The key
+# doubles as a strong ETag: a client presenting it in If-None-Match already
+# holds the current payload and gets 304 without any recomputation. Encoded
+# bodies live in a byte-bounded memory tier (RESPONSE_CACHE_MAX_MB) and, if
+# RESPONSE_CACHE_DIR is set, in a disk tier shared across workers/restarts.
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "")
+RESPONSE_CACHE_DISK_MAX_BYTES = int(float(os.getenv("RESPONSE_CACHE_DISK_MAX_MB", "256")) * 1024 * 1024)
+
+_memory = TTLCache(
+    max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024),
+    ttl_seconds=RESPONSE_CACHE_TTL,
+    sizer=lambda entry: len(entry[1]),
+)
+_disk_lock = threading.Lock()
+_last_disk_evict = 0.0
+_stats_lock = threading.Lock()
+_stats = {"disk_hits": 0, "not_modified": 0}
+
+def _count(stat: str) -> None:
+    with _stats_lock:
+        _stats[stat] += 1
+
+def data_version(tickers: List[str], period: str, interval: str = "1d") -> str:
+    # cheap when warm: the frame comes from the shared price cache
+    return price_version(get_price_df(tickers, period=period, interval=interval))
+
+def cache_key(route: str, params: dict, version: str, fmt: str) -> str:
+    blob = json.dumps([route, params, version, fmt], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+def _encode(payload: Any, fmt: str) -> Tuple[str, bytes]:
+    rendered = render(payload, fmt)
+    if not isinstance(rendered, Response):
+        rendered = json_response(jsonable_encoder(rendered))
+    return rendered.media_type, bytes(rendered.body)
+
+def _disk_path(key: str) -> str:
+    return os.path.join(RESPONSE_CACHE_DIR, key[:2], key + ".bin")
+
+def _disk_get(key: str) -> Optional[Tuple[str, bytes]]:
+    if not RESPONSE_CACHE_DIR:
+        return None
+    path = _disk_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > RESPONSE_CACHE_TTL:
+            return None
+        with open(path, "rb") as f:
+            media_type, _, body = f.read().partition(b"\n")
+    except OSError:
+        return None
+    return media_type.decode("ascii"), body
+
+def _disk_set(key: str, entry: Tuple[str, bytes]) -> None:
+    if not RESPONSE_CACHE_DIR:
+        return
+    path = _disk_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(entry[0].encode("ascii") + b"\n" + entry[1])
+        os.replace(tmp, path)
+    except OSError:
+        return
+    _disk_evict()
+
+def _disk_evict() -> None:
+    # drop expired entries, then the oldest ones beyond the size bound; at most once a minute
+    global _last_disk_evict
+    now = time.time()
+    with _disk_lock:
+        if now - _last_disk_evict < 60:
+            return
+        _last_disk_evict = now
+        entries, total = [], 0
+        for root, _, files in os.walk(RESPONSE_CACHE_DIR):
+            for name in files:
+                p = os.path.join(root, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+        entries.sort()
+        for mtime, size, p in entries:
+            if total <= RESPONSE_CACHE_DISK_MAX_BYTES and now - mtime <= RESPONSE_CACHE_TTL:
+                continue
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+
+def cached_response(
+    route: str,
+    params: dict,
+    tickers: List[str],
+    period: str,
+    build: Callable[[], Any],
+    fmt: str = "records",
+    if_none_match: Optional[str] = None,
+    interval: str = "1d",
+) -> Response:
+    key = cache_key(route, params, data_version(tickers, period, interval), fmt)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if _matches(if_none_match, etag):
+        _count("not_modified")
+        return Response(status_code=304, headers=headers)
+
+    def load() -> Tuple[str, bytes]:
+        entry = _disk_get(key)
+        if entry is not None:
+            _count("disk_hits")
+            return entry
+        entry = _encode(build(), fmt)
+        _disk_set(key, entry)
+        return entry
+
+    media_type, body = _memory.get_or_load(key, load)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def stats() -> dict:
+    with _stats_lock:
+        counts = dict(_stats)
+    return {"memory": _memory.stats(), "disk_enabled": bool(RESPONSE_CACHE_DIR), **counts}
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.adfvalues import mackinnonp
+
+from .data import get_price_df
+
+# All-pairs Engle-Granger screen over one aligned log-price matrix.
+#
+# For a pair (i, j) the cointegrating residual is e = x_i - b*x_j (centered
+# data absorbs the intercept), and every ADF regressor (e_{t-1}, lagged
+# diffs) is the same linear combination of per-asset series. So a single
+# Gram matrix over the per-asset lag blocks gives each pair's ADF normal
+# equations as A - b(B + B') + b^2 C, and all pairs are solved as one
+# batched (m x m) system. Lags are fixed (no AIC search); the top-k pairs
+# are then re-tested exactly by the caller.
+
+SCREEN_WORKERS = int(os.getenv("SCREEN_WORKERS", "1"))
+SCREEN_CHUNK = 20000
+
+def aligned_log_prices(prices: pd.DataFrame, max_missing: float = 0.05) -> pd.DataFrame:
+    px = prices.astype(float)
+    px = px.loc[:, px.notna().mean() >= 1.0 - max_missing]
+    px = px.ffill(limit=5).dropna()
+    px = px.loc[:, (px > 0).all()]
+    return np.log(px)
+
+def _lag_blocks(X: np.ndarray, lags: int) -> np.ndarray:
+    # (T, n) -> (N, n, m) with m = lags + 2: [dx_t, x_{t-1}, dx_{t-1}, ..., dx_{t-lags}]
+    dx = np.diff(X, axis=0)
+    cols = [dx[lags:], X[lags:-1]]
+    for l in range(1, lags + 1):
+        cols.append(dx[lags - l:len(dx) - l])
+    return np.stack(cols, axis=2)
+
+def _adf_stats(G4: np.ndarray, beta: np.ndarray, I: np.ndarray, J: np.ndarray, nobs: int) -> np.ndarray:
+    b = beta[I, J][:, None, None]
+    B = G4[I, :, J, :]
+    H = G4[I, :, I, :] - b * (B + B.transpose(0, 2, 1)) + b * b * G4[J, :, J, :]
+
+    ZZ = H[:, 1:, 1:]
+    Zy = H[:, 1:, 0]
+    yy = H[:, 0, 0]
+    try:
+        ZZ_inv = np.linalg.inv(ZZ)
+    except np.linalg.LinAlgError:
+        # an exactly degenerate pair in the chunk (identical or collinear
+        # series); its statistic comes out non-finite and ranks last
+        ZZ_inv = np.linalg.pinv(ZZ)
+    coef = np.einsum("pab,pb->pa", ZZ_inv, Zy)
+    ssr = yy - (coef * Zy).sum(axis=1)
+    s2 = np.maximum(ssr, 0.0) / max(1, nobs - ZZ.shape[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = coef[:, 0] / np.sqrt(s2 * ZZ_inv[:, 0, 0])
+    return np.where(np.isfinite(t), t, np.inf)
+
+_worker_state: dict = {}
+
+def _init_worker(G4: np.ndarray, beta: np.ndarray, nobs: int) -> None:
+    _worker_state.update(G4=G4, beta=beta, nobs=nobs)
+
+def _adf_chunk(I: np.ndarray, J: np.ndarray) -> np.ndarray:
+    st = _worker_state
+    return _adf_stats(st["G4"], st["beta"], I, J, st["nobs"])
+
+def screen_pairs(
+    tickers: List[str],
+    period: str = "2y",
+    top_k: int = 10,
+    lags: int = 1,
+    workers: Optional[int] = None,
+    prices: Optional[pd.DataFrame] = None,
+) -> dict:
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    if prices is None:
+        prices = get_price_df(tickers, period=period)
+    logp = aligned_log_prices(prices[[t for t in tickers if t in prices.columns]])
+    names = list(logp.columns)
+    n = len(names)
+    if n < 2:
+        raise ValueError("Need at least 2 tickers with aligned price history")
+    if len(logp) < lags + 20:
+        raise ValueError("Not enough overlapping history to screen pairs")
+
+    X = logp.to_numpy(dtype=np.float64)
+    X = X - X.mean(axis=0)
+
+    # Hedge ratios for every ordered pair: OLS of x_i on x_j
+    C = X.T @ X
+    beta = C / np.diag(C)[None, :]
+
+    blocks = _lag_blocks(X, lags)
+    nobs, _, m = blocks.shape
+    Z = blocks.reshape(nobs, n * m)
+    G4 = (Z.T @ Z).reshape(n, m, n, m)
+
+    I, J = np.triu_indices(n, k=1)
+    chunks = [(I[s:s + SCREEN_CHUNK], J[s:s + SCREEN_CHUNK]) for s in range(0, len(I), SCREEN_CHUNK)]
+    workers = SCREEN_WORKERS if workers is None else workers
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(G4, beta, nobs)) as pool:
+            stats = np.concatenate(list(pool.map(_adf_chunk, *zip(*chunks))))
+    else:
+        stats = np.concatenate([_adf_stats(G4, beta, ci, cj, nobs) for ci, cj in chunks])
+
+    # The MacKinnon p-value is monotone in the statistic, so rank on the
+    # statistic and only evaluate p-values for the survivors.
+    k = min(max(1, top_k), len(stats))
+    top = np.argpartition(stats, k - 1)[:k]
+    top = top[np.argsort(stats[top])]
+
+    pairs = []
+    for p in top:
+        i, j = int(I[p]), int(J[p])
+        stat = float(stats[p])
+        pairs.append({
+            "ticker1": names[i],
+            "ticker2": names[j],
+            "hedge_ratio": float(beta[i, j]),
+            "adf_stat": stat,
+            "pvalue": float(mackinnonp(stat, regression="c", N=2)) if np.isfinite(stat) else 1.0,
+        })
+
+    return {
+        "universe": names,
+        "dropped": [t for t in tickers if t not in names],
+        "n_pairs": int(len(stats)),
+        "lags": lags,
+        "top": pairs,
+    }
@@ -0,0 +1,277 @@
+from __future__ import annotations
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from . import lazy
+from .data import get_price_df
+
+# Live pairs monitoring.
+#
+# Each watched pair keeps its hedge ratio plus ring buffers of the last
+# `window` log prices and spreads with running sum / sum of squares, so a
+# new price moves the rolling z-score in O(1). Every incoming tick for a leg
+# is one observation (feeds should push bar closes). The hedge ratio and
+# cointegration p-value are re-estimated in the background every
+# PAIRS_REESTIMATE_SECONDS, which also re-derives the buffered spreads and
+# resets the running sums. Subscribers receive updates over SSE.
+PAIRS_PERIOD = os.getenv("PAIRS_STREAM_PERIOD", "1y")
+PAIRS_REESTIMATE_SECONDS = float(os.getenv("PAIRS_REESTIMATE_SECONDS", "300"))
+PAIRS_POLL_SECONDS = float(os.getenv("PAIRS_POLL_SECONDS", "0"))  # 0 = only pushed ticks
+PAIRS_IDLE_SECONDS = float(os.getenv("PAIRS_IDLE_SECONDS", "900"))
+
+def pair_key(ticker1: str, ticker2: str, window: int) -> str:
+    return f"{ticker1}/{ticker2}/{int(window)}"
+
+class PairState:
+    def __init__(self, ticker1: str, ticker2: str, window: int, hedge_ratio: float, pvalue: float,
+                 log1: np.ndarray, log2: np.ndarray):
+        self.ticker1 = ticker1
+        self.ticker2 = ticker2
+        self.window = int(window)
+        self.hedge_ratio = float(hedge_ratio)
+        self.pvalue = float(pvalue)
+        self.log1 = deque(np.asarray(log1, dtype=float)[-self.window:], maxlen=self.window)
+        self.log2 = deque(np.asarray(log2, dtype=float)[-self.window:], maxlen=self.window)
+        self.last_z: Optional[float] = None
+        self.last_spread: Optional[float] = None
+        self.ts: Optional[str] = None
+        self.reestimated_at = time.time()
+        self.touched_at = time.time()
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        sp = np.asarray(self.log1) - self.hedge_ratio * np.asarray(self.log2)
+        self.spreads = deque(sp, maxlen=self.window)
+        self.sum = float(sp.sum())
+        self.sumsq = float((sp * sp).sum())
+        if len(sp):
+            self.last_spread = float(sp[-1])
+            self.last_z = self._z(self.last_spread)
+
+    def _z(self, s: float) -> Optional[float]:
+        # z of the newest spread against the window it belongs to (ddof=0, as in pairs_analyze)
+        n = len(self.spreads)
+        if n < self.window:
+            return None
+        mean = self.sum / n
+        var = self.sumsq / n - mean * mean
+        return float((s - mean) / np.sqrt(var)) if var > 0 else None
+
+    def update(self, price1: float, price2: float, ts: Optional[str] = None) -> dict:
+        l1, l2 = float(np.log(price1)), float(np.log(price2))
+        s = l1 - self.hedge_ratio * l2
+        if len(self.spreads) == self.window:
+            old = self.spreads[0]
+            self.sum -= old
+            self.sumsq -= old * old
+        self.spreads.append(s)
+        self.log1.append(l1)
+        self.log2.append(l2)
+        self.sum += s
+        self.sumsq += s * s
+        self.last_spread = s
+        self.last_z = self._z(s)
+        self.ts = ts
+        self.touched_at = time.time()
+        return self.snapshot()
+
+    def reestimate(self, hedge_ratio: float, pvalue: float) -> dict:
+        self.hedge_ratio = float(hedge_ratio)
+        self.pvalue = float(pvalue)
+        self.reestimated_at = time.time()
+        self._rebuild()
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        return {
+            "ticker1": self.ticker1,
+            "ticker2": self.ticker2,
+            "window": self.window,
+            "hedge_ratio": self.hedge_ratio,
+            "pvalue": self.pvalue,
+            "spread": self.last_spread,
+            "z": self.last_z,
+            "ts": self.ts,
+        }
+
+def _estimate(ticker1: str, ticker2: str):
+    from statsmodels.tsa.stattools import coint
+    ols_hedge_ratio = lazy.load("pairs").ols_hedge_ratio
+
+    prices = get_price_df([ticker1, ticker2], period=PAIRS_PERIOD)
+    if ticker1 not in prices.columns or ticker2 not in prices.columns:
+        raise ValueError("Missing data for one or both tickers")
+    px = prices[[ticker1, ticker2]].dropna().astype(float)
+    log1, log2 = np.log(px[ticker1]), np.log(px[ticker2])
+    hr = ols_hedge_ratio(log1, log2)
+    _, pvalue, _ = coint(log1, log2)
+    return hr, float(pvalue), log1.to_numpy(), log2.to_numpy(), px.index[-1].strftime("%Y-%m-%d")
+
+class PairMonitor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pairs: Dict[str, PairState] = {}
+        self._by_ticker: Dict[str, Set[str]] = {}
+        self._subs: Dict[str, List[tuple]] = {}
+        self.last_price: Dict[str, float] = {}
+
+    def watch(self, ticker1: str, ticker2: str, window: int) -> PairState:
+        key = pair_key(ticker1, ticker2, window)
+        with self._lock:
+            st = self.pairs.get(key)
+        if st is not None:
+            return st
+        hr, pvalue, log1, log2, ts = _estimate(ticker1, ticker2)
+        st = PairState(ticker1, ticker2, window, hr, pvalue, log1, log2)
+        st.ts = ts
+        with self._lock:
+            st = self.pairs.setdefault(key, st)
+            self._by_ticker.setdefault(ticker1, set()).add(key)
+            self._by_ticker.setdefault(ticker2, set()).add(key)
+        return st
+
+    def unwatch(self, key: str) -> None:
+        with self._lock:
+            st = self.pairs.pop(key, None)
+            if st is None:
+                return
+            for t in (st.ticker1, st.ticker2):
+                keys = self._by_ticker.get(t)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._by_ticker[t]
+
+    def push_prices(self, prices: Dict[str, float], ts: Optional[str] = None) -> int:
+        # Apply ticks; every pair touching a ticked leg (with a known price for
+        # the other leg) gets one O(1) update. Returns the number of pair updates.
+        updates = []
+        with self._lock:
+            for t, p in prices.items():
+                if p is None or not p > 0:
+                    continue
+                self.last_price[t] = float(p)
+            touched = set()
+            for t in prices:
+                touched.update(self._by_ticker.get(t, ()))
+            for key in touched:
+                st = self.pairs[key]
+                p1, p2 = self.last_price.get(st.ticker1), self.last_price.get(st.ticker2)
+                if p1 is not None and p2 is not None:
+                    updates.append((key, st.update(p1, p2, ts)))
+        for key, snap in updates:
+            self._publish(key, snap)
+        return len(updates)
+
+    def subscribe(self, key: str) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=256)
+        with self._lock:
+            self._subs.setdefault(key, []).append((asyncio.get_running_loop(), q))
+        return q
+
+    def unsubscribe(self, key: str, q: asyncio.Queue) -> None:
+        with self._lock:
+            subs = [s for s in self._subs.get(key, []) if s[1] is not q]
+            if subs:
+                self._subs[key] = subs
+            else:
+                self._subs.pop(key, None)
+
+    def _publish(self, key: str, snap: dict) -> None:
+        with self._lock:
+            subs = list(self._subs.get(key, []))
+        for loop, q in subs:
+            loop.call_soon_threadsafe(_offer, q, snap)
+
+    def reestimate_due(self) -> None:
+        now = time.time()
+        with self._lock:
+            due = [(k, st) for k, st in self.pairs.items() if now - st.reestimated_at >= PAIRS_REESTIMATE_SECONDS]
+        for key, st in due:
+            try:
+                hr, pvalue, _, _, _ = _estimate(st.ticker1, st.ticker2)
+            except Exception:
+                st.reestimated_at = now  # retry next interval
+                continue
+            with self._lock:
+                snap = st.reestimate(hr, pvalue)
+            self._publish(key, snap)
+
+    def poll_prices(self) -> None:
+        with self._lock:
+            tickers = sorted(self._by_ticker)
+        if not tickers:
+            return
+        px = get_price_df(tickers, period="5d").ffill()
+        if px.empty:
+            return
+        last = px.iloc[-1]
+        ts = px.index[-1].strftime("%Y-%m-%d")
+        with self._lock:
+            fresh = {t: float(last[t]) for t in tickers if t in last.index and self.last_price.get(t) != float(last[t])}
+        if fresh:
+            self.push_prices(fresh, ts=ts)
+
+    def drop_idle(self) -> None:
+        now = time.time()
+        with self._lock:
+            idle = [k for k, st in self.pairs.items() if k not in self._subs and now - st.touched_at > PAIRS_IDLE_SECONDS]
+        for key in idle:
+            self.unwatch(key)
+
+    async def run_maintenance(self, interval: float = 5.0) -> None:
+        last_poll = 0.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reestimate_due)
+                if PAIRS_POLL_SECONDS > 0 and time.time() - last_poll >= PAIRS_POLL_SECONDS:
+                    last_poll = time.time()
+                    await asyncio.to_thread(self.poll_prices)
+                self.drop_idle()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                continue
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pairs": len(self.pairs),
+                "tickers": len(self._by_ticker),
+                "subscribers": sum(len(v) for v in self._subs.values()),
+            }
+
+def _offer(q: asyncio.Queue, snap: dict) -> None:
+    # slow consumers only need the newest z: drop the oldest queued update
+    if q.full():
+        try:
+            q.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    q.put_nowait(snap)
+
+MONITOR = PairMonitor()
+
+async def sse_stream(monitor: PairMonitor, key: str, keepalive: float = 15.0):
+    q = monitor.subscribe(key)
+    try:
+        st = monitor.pairs.get(key)
+        if st is not None:
+            yield f"event: snapshot\ndata: {json.dumps(st.snapshot())}\n\n"
+        while True:
+            try:
+                snap = await asyncio.wait_for(q.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: z\ndata: {json.dumps(snap)}\n\n"
+    finally:
+        monitor.unsubscribe(key, q)
@@ -1,37 +1,138 @@
 from __future__ import annotations
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
 import numpy as np
 import pandas as pd
 from arch import arch_model
-from .data import get_price_df
+from . import metrics
+from .cache import TTLCache
+from .data import bars_per_year, date_labels, get_price_df, normalize_interval
+from .encoding import downsample, encode_points
 
-def volatility_forecast(ticker: str, period="2y", model="garch") -> dict:
-    prices = get_price_df([ticker], period=period)[ticker].astype(float)
-    rets = np.log(prices).diff().dropna()  # daily log returns
+# Fitted-parameter cache. A request whose returns end on the same date as the
+# cached fit is answered from the stored state; up to VOL_UPDATE_BARS new bars
+# are absorbed by running the variance recursion forward with the fitted
+# parameters, and beyond that the model is refit warm-started from them.
+VOL_UPDATE_BARS = int(os.getenv("VOL_UPDATE_BARS", "5"))
+_FIT_CACHE = TTLCache(max_bytes=16 * 1024 * 1024, ttl_seconds=float(os.getenv("VOL_FIT_TTL", str(7 * 86400))))
+_fit_locks: dict = {}  # key -> [lock, holders + waiters]; dropped when the last one leaves
+_fit_locks_guard = threading.Lock()
 
-    # Realized vol series (annualized, %)
-    rv = rets.rolling(21).std(ddof=0) * np.sqrt(252) * 100.0
-    points = pd.DataFrame({
-        "date": rv.index.strftime("%Y-%m-%d"),
-        "vol": rv.values
-    }).dropna().tail(252).to_dict(orient="records")
+@dataclass
+class _FitState:
+    model: str
+    params: np.ndarray      # arch order: garch [omega, alpha, beta]; egarch [omega, alpha, gamma, beta]
+    last_date: pd.Timestamp
+    last_ret: float         # last % return
+    last_var: float         # conditional variance at last_date
+    bars_since_fit: int
+    fitted_at: float
 
-    # GARCH forecast (annualized, %)
-    r = (rets * 100.0).dropna()  # scale to percent returns for arch stability
+def _next_var(model: str, params: np.ndarray, ret: float, var: float) -> float:
+    if model == "egarch":
+        omega, alpha, gamma, beta = params
+        e = ret / np.sqrt(var)
+        return float(np.exp(omega + alpha * (abs(e) - np.sqrt(2.0 / np.pi)) + gamma * e + beta * np.log(var)))
+    omega, alpha, beta = params
+    return float(omega + alpha * ret * ret + beta * var)
 
-    if model.lower() == "egarch":
+def _fit(r: pd.Series, model: str, starting_values: Optional[np.ndarray] = None) -> _FitState:
+    if model == "egarch":
         am = arch_model(r, mean="Zero", vol="EGARCH", p=1, o=1, q=1, dist="normal")
     else:
         am = arch_model(r, mean="Zero", vol="GARCH", p=1, q=1, dist="normal")
 
-    res = am.fit(disp="off")
-    f = res.forecast(horizon=1)
-    var1 = float(f.variance.iloc[-1, 0])  # variance of % returns
-    sigma_daily = np.sqrt(var1) / 100.0
-    sigma_annual_pct = sigma_daily * np.sqrt(252) * 100.0
+    res = am.fit(disp="off", starting_values=starting_values)
+    cond_vol = res.conditional_volatility
+    return _FitState(
+        model=model,
+        params=np.asarray(res.params, dtype=float),
+        last_date=r.index[-1],
+        last_ret=float(r.iloc[-1]),
+        last_var=float(cond_vol.iloc[-1]) ** 2,
+        bars_since_fit=0,
+        fitted_at=time.time(),
+    )
+
+def _advance(state: _FitState, new: pd.Series) -> _FitState:
+    ret, var = state.last_ret, state.last_var
+    for x in new.to_numpy(dtype=float):
+        var = _next_var(state.model, state.params, ret, var)
+        ret = x
+    return _FitState(
+        model=state.model,
+        params=state.params,
+        last_date=new.index[-1],
+        last_ret=ret,
+        last_var=var,
+        bars_since_fit=state.bars_since_fit + len(new),
+        fitted_at=state.fitted_at,
+    )
+
+def _fitted_state(ticker: str, period: str, model: str, r: pd.Series, interval: str = "1d"):
+    key = (ticker, model, period, interval)
+    with _fit_locks_guard:
+        entry = _fit_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    # one fit per key at a time; concurrent callers reuse its result
+    try:
+        with entry[0]:
+            return _fit_or_reuse(key, model, r)
+    finally:
+        with _fit_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _fit_locks[key]
+
+def _fit_or_reuse(key: tuple, model: str, r: pd.Series):
+    state = _FIT_CACHE.get(key)
+    last_date = r.index[-1]
+    if state is not None and state.last_date == last_date:
+        return state, "cached"
+    if state is not None and state.last_date < last_date and state.last_date in r.index:
+        new = r.loc[r.index > state.last_date]
+        if state.bars_since_fit + len(new) <= VOL_UPDATE_BARS:
+            state, mode = _advance(state, new), "updated"
+        else:
+            state, mode = _fit(r, model, starting_values=state.params), "warm_refit"
+    else:
+        state, mode = _fit(r, model), "full_fit"
+    _FIT_CACHE.set(key, state)
+    return state, mode
+
+def volatility_forecast(ticker: str, period="2y", model="garch", points_format="records",
+                        interval="1d", max_points=None) -> dict:
+    interval = normalize_interval(interval)
+    ann = bars_per_year(interval)
+    prices = get_price_df([ticker], period=period, interval=interval)[ticker].astype(float)
+    rets = np.log(prices).diff().dropna()  # per-bar log returns
+
+    # Realized vol series over 21 bars (annualized, %), last year of bars within the point budget
+    rv = rets.rolling(21).std(ddof=0) * np.sqrt(ann) * 100.0
+    points = encode_points(downsample(pd.DataFrame({
+        "date": date_labels(rv.index, interval),
+        "vol": rv.values
+    }).dropna().tail(int(ann)), max_points, y="vol"), points_format)
+
+    # GARCH forecast (annualized, %)
+    r = (rets * 100.0).dropna()  # scale to percent returns for arch stability
+
+    kind = "egarch" if model.lower() == "egarch" else "garch"
+    t0 = time.perf_counter()
+    state, fit_mode = _fitted_state(ticker, period, kind, r, interval)
+    metrics.observe_model(kind, fit_mode, time.perf_counter() - t0)
+    var1 = _next_var(state.model, state.params, state.last_ret, state.last_var)  # variance of % returns
+    sigma_bar = np.sqrt(var1) / 100.0
+    sigma_annual_pct = sigma_bar * np.sqrt(ann) * 100.0
 
     return {
         "ticker": ticker,
         "model": model,
+        "interval": interval,
         "forecast": round(sigma_annual_pct, 4),
+        "fit": fit_mode,
         "points": points,
     }
@@ -0,0 +1,267 @@
+"""Offline benchmark harness for the v2 analytics.
+
+Usage (from backend/backend_v2):
+
+    python -m benchmarks.run                      # full matrix, compare to baseline if present
+    python -m benchmarks.run --quick -k pairs     # small sizes, only cases matching "pairs"
+    python -m benchmarks.run --save-baseline      # record benchmarks/baseline.json
+    python -m benchmarks.run --check              # exit 1 on regressions vs the baseline
+
+No baseline is committed: timings only compare on the machine that took
+them, so record one with --save-baseline (same --quick/-k as the checks)
+before the first --check; --check exits 2 when there is none.
+
+Prices come from the mock provider (PRICE_PROVIDER=mock, ALLOW_MOCK_DATA=1)
+and every on-disk store points at a scratch directory, so runs need no
+network and do not touch the dev caches. Each case is measured as:
+
+  cold  - one call after clearing the in-process caches (disk stores kept)
+  warm  - `--repeat` further calls, reported as min / median
+  peak  - tracemalloc peak of one more cold call
+
+Regressions are flagged when a cold or warm median exceeds the baseline by
+more than --threshold (relative) and --min-delta-ms (absolute).
+"""
+from __future__ import annotations
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+_SCRATCH = os.environ.get("BENCH_DATA_DIR") or tempfile.mkdtemp(prefix="alphaterminal-bench-")
+for _k, _v in {
+    "PRICE_PROVIDER": "mock",
+    "ALLOW_MOCK_DATA": "1",
+    "PRICE_STORE_DIR": os.path.join(_SCRATCH, "store"),
+    "FEATURE_STORE_DIR": os.path.join(_SCRATCH, "features"),
+    "ML_REGISTRY_DIR": os.path.join(_SCRATCH, "models"),
+    "RESPONSE_CACHE_DIR": "",
+    "SERVER_TIMING": "0",
+}.items():
+    os.environ[_k] = _v  # before any app module reads its configuration
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+UNIVERSE = [
+    "AAPL", "MSFT", "GOOG", "AMZN", "META", "NVDA", "TSLA", "JPM", "BAC", "XOM",
+    "CVX", "KO", "PEP", "PG", "JNJ", "PFE", "MRK", "WMT", "COST", "HD",
+    "DIS", "NFLX", "INTC", "AMD", "CSCO", "ORCL", "IBM", "QCOM", "TXN", "AVGO",
+    "GS", "MS", "C", "WFC", "V", "MA", "PYPL", "ADBE", "CRM", "NKE",
+    "MCD", "SBUX", "T", "VZ", "CAT", "DE", "BA", "GE", "MMM", "UNH",
+]
+
+@dataclass
+class Case:
+    name: str
+    params: Dict[str, object]
+    fn: Callable[[], object]
+    repeat: Optional[int] = None  # overrides --repeat for slow cases
+
+    @property
+    def key(self) -> str:
+        return self.name + "[" + ",".join(f"{k}={v}" for k, v in self.params.items()) + "]"
+
+@dataclass
+class Result:
+    key: str
+    cold_s: float
+    warm_min_s: float
+    warm_median_s: float
+    peak_mb: float
+    extra: Dict[str, float] = field(default_factory=dict)
+
+def _clear_caches() -> None:
+    from app import data, features, model_registry, portfolio, response_cache, volatility
+    for cache in (data.PRICE_CACHE, features._loaded, model_registry._loaded, portfolio._MOMENTS,
+                  response_cache._memory, volatility._FIT_CACHE):
+        cache.clear()
+
+def build_cases(quick: bool) -> List[Case]:
+    from app.pairs import pairs_analyze
+    from app.volatility import volatility_forecast
+    from app.ml import ml_predict
+    from app.portfolio import optimize_portfolio
+    from app.market_making import simulate_market_making
+    from app.options import black_scholes, black_scholes_chain
+    from app.research import replicate
+    from app.encoding import lttb_indices
+    import numpy as np
+
+    periods = ["1y", "2y"] if quick else ["1y", "2y", "5y"]
+    n_assets = [5, 10] if quick else [5, 20, 50]
+    cases: List[Case] = []
+
+    for period in periods:
+        cases.append(Case("pairs_analyze", {"period": period},
+                          lambda p=period: pairs_analyze("AAPL", "MSFT", period=p)))
+        cases.append(Case("pairs_analyze_kalman", {"period": period},
+                          lambda p=period: pairs_analyze("AAPL", "MSFT", period=p, hedge="kalman")))
+        cases.append(Case("volatility_forecast", {"period": period},
+                          lambda p=period: volatility_forecast("AAPL", period=p)))
+    cases.append(Case("pairs_analyze_intraday", {"interval": "5m", "period": "1mo"},
+                      lambda: pairs_analyze("AAPL", "MSFT", period="1mo", interval="5m", max_points=500)))
+    for n in ([20_000] if quick else [20_000, 200_000]):
+        y = np.cumsum(np.random.default_rng(0).normal(size=n))
+        cases.append(Case("lttb", {"points": n, "budget": 2000}, lambda y=y: lttb_indices(y, 2000)))
+    for years in ([1] if quick else [1, 3]):
+        cases.append(Case("ml_predict", {"train_years": years},
+                          lambda y=years: ml_predict("AAPL", train_years=y), repeat=3))
+    for n in n_assets:
+        for period in periods[-2:]:
+            cases.append(Case("optimize_portfolio", {"tickers": n, "period": period},
+                              lambda n=n, p=period: optimize_portfolio(UNIVERSE[:n], period=p)))
+    for steps in ([1_000] if quick else [1_000, 10_000]):
+        cases.append(Case("simulate_market_making", {"steps": steps},
+                          lambda s=steps: simulate_market_making(steps=s)))
+    cases.append(Case("black_scholes", {}, lambda: black_scholes(100.0, 105.0, 0.5, 0.01, 0.2)))
+    for n in ([1_000] if quick else [1_000, 100_000]):
+        rng = np.random.default_rng(0)
+        K, T = rng.uniform(50, 150, n), rng.uniform(0.05, 2.0, n)
+        cases.append(Case("black_scholes_chain", {"contracts": n},
+                          lambda K=K, T=T: black_scholes_chain(100.0, K, T, 0.01, 0.2)))
+    for n in ([8] if quick else [8, 30]):
+        cases.append(Case("research_replicate", {"universe": n},
+                          lambda n=n: replicate("gatev2006", tickers=UNIVERSE[:n]), repeat=3))
+    cases += _http_cases(quick)
+    return cases
+
+def _http_cases(quick: bool) -> List[Case]:
+    # End-to-end through the ASGI app (routing, validation, middleware, serialization).
+    from fastapi.testclient import TestClient
+    from app.main import app
+    client = TestClient(app)
+
+    def call(method: str, url: str, **kw):
+        def run():
+            r = client.request(method, url, **kw)
+            if r.status_code != 200:
+                raise RuntimeError(f"{method} {url} -> {r.status_code}: {r.text[:200]}")
+            return r
+        return run
+
+    cases = [
+        Case("http_health", {}, call("GET", "/api/health")),
+        Case("http_options_price", {}, call("GET", "/api/options/price?S=100&K=105&T=0.5&r=0.01&sigma=0.2")),
+        Case("http_pairs_analyze", {"format": "records"}, call("GET", "/api/pairs/analyze?ticker1=AAPL&ticker2=MSFT")),
+        Case("http_pairs_analyze", {"format": "binary"}, call("GET", "/api/pairs/analyze?ticker1=AAPL&ticker2=MSFT&format=binary")),
+        Case("http_volatility_forecast", {}, call("GET", "/api/volatility/forecast?ticker=AAPL")),
+        Case("http_price_bars", {"interval": "1m", "max_points": 1000},
+             call("GET", "/api/prices/bars?ticker=AAPL&period=5d&interval=1m&max_points=1000")),
+        Case("http_portfolio_optimize", {"tickers": 10},
+             call("POST", "/api/portfolio/optimize", json={"tickers": UNIVERSE[:10]})),
+        Case("http_batch", {"requests": 8},
+             call("POST", "/api/batch", json={"requests": [
+                 *({"id": f"p{i}", "type": "pairs", "params": {"ticker1": UNIVERSE[i], "ticker2": UNIVERSE[i + 1]}} for i in range(3)),
+                 *({"id": f"v{i}", "type": "volatility", "params": {"ticker": UNIVERSE[i]}} for i in range(3)),
+                 {"id": "opt", "type": "portfolio", "params": {"tickers": UNIVERSE[:5]}},
+                 {"id": "bs", "type": "options", "params": {"S": 100, "K": 105, "T": 0.5, "r": 0.01, "sigma": 0.2}},
+             ]})),
+        Case("http_market_making", {"steps": 2000},
+             call("POST", "/api/market-making/simulate", json={"steps": 2000})),
+    ]
+    return cases
+
+def measure(case: Case, repeat: int) -> Result:
+    _clear_caches()
+    gc.collect()
+    t0 = time.perf_counter()
+    case.fn()
+    cold = time.perf_counter() - t0
+
+    warm = []
+    for _ in range(case.repeat or repeat):
+        t0 = time.perf_counter()
+        case.fn()
+        warm.append(time.perf_counter() - t0)
+
+    _clear_caches()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(case.key, cold, min(warm), statistics.median(warm), peak / 1e6)
+
+def compare(results: List[Result], baseline: dict, threshold: float, min_delta_ms: float) -> List[dict]:
+    regressions = []
+    base = baseline.get("results", {})
+    for r in results:
+        b = base.get(r.key)
+        if not b:
+            continue
+        for metric in ("cold_s", "warm_median_s"):
+            old, new = float(b[metric]), float(getattr(r, metric))
+            if new > old * (1 + threshold) and (new - old) * 1000 > min_delta_ms:
+                regressions.append({"case": r.key, "metric": metric, "baseline": old, "current": new,
+                                    "ratio": round(new / old, 2) if old > 0 else None})
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="AlphaTerminal v2 offline benchmarks")
+    ap.add_argument("--quick", action="store_true", help="small data sizes only")
+    ap.add_argument("-k", "--filter", default="", help="only cases whose key contains this substring")
+    ap.add_argument("--repeat", type=int, default=5, help="warm repetitions per case")
+    ap.add_argument("--out", default="", help="write results JSON here")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    ap.add_argument("--check", action="store_true", help="exit 1 if any regression is found")
+    ap.add_argument("--threshold", type=float, default=0.25, help="relative slowdown to flag (0.25 = 25%%)")
+    ap.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore slowdowns smaller than this")
+    args = ap.parse_args(argv)
+    if args.check and not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; record one first with --save-baseline", file=sys.stderr)
+        return 2
+
+    try:
+        cases = [c for c in build_cases(args.quick) if args.filter in c.key]
+        results = []
+        print(f"{'case':<58} {'cold ms':>10} {'warm ms':>10} {'peak MB':>9}")
+        for case in cases:
+            r = measure(case, args.repeat)
+            results.append(r)
+            print(f"{r.key:<58} {r.cold_s * 1000:>10.2f} {r.warm_median_s * 1000:>10.2f} {r.peak_mb:>9.2f}", flush=True)
+    finally:
+        if not os.environ.get("BENCH_DATA_DIR"):
+            shutil.rmtree(_SCRATCH, ignore_errors=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "quick": args.quick,
+        "repeat": args.repeat,
+        "results": {r.key: {k: v for k, v in r.__dict__.items() if k != "key"} for r in results},
+    }
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_delta_ms)
+        report["regressions"] = regressions
+        for reg in regressions:
+            print(f"REGRESSION {reg['case']} {reg['metric']}: {reg['baseline'] * 1000:.2f} ms -> "
+                  f"{reg['current'] * 1000:.2f} ms (x{reg['ratio']})")
+        if not regressions:
+            print(f"no regressions vs {args.baseline}")
+
+    for path in [args.out] + ([args.baseline] if args.save_baseline else []):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"wrote {path}")
+
+    return 1 if args.check and regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# tests import the service as `app`, the way run_dev.sh starts it from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
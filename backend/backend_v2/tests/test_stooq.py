@@ -0,0 +1,99 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app import data
+
+# Stub of Stooq's CSV endpoint (/q/d/l/?s=<symbol>&i=d&d1=YYYYMMDD&d2=YYYYMMDD):
+#   aaa.us  200 with daily bars
+#   flk.us  503 once, then 200 (transient failure, retried)
+#   dwn.us  503 always
+#   bad.us  404
+#   txt.us  200 with a non-CSV body
+class _Stub(BaseHTTPRequestHandler):
+    hits: dict = {}
+    queries: list = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        _Stub.queries.append((url.path, q))
+        sym = q.get("s", "")
+        n = _Stub.hits[sym] = _Stub.hits.get(sym, 0) + 1
+        if url.path != "/q/d/l/" or sym == "bad.us":
+            return self._send(404, "Not found")
+        if sym == "dwn.us" or (sym == "flk.us" and n == 1):
+            return self._send(503, "busy")
+        if sym == "txt.us":
+            return self._send(200, "Exceeded the daily hits limit")
+        start = datetime.strptime(q["d1"], "%Y%m%d")
+        rows = ["Date,Open,High,Low,Close,Volume"]
+        for i in range(5):
+            d = start + timedelta(days=i)
+            rows.append(f"{d:%Y-%m-%d},1,1,1,{100 + i},1000")
+        self._send(200, "\n".join(rows) + "\n")
+
+    def _send(self, code, body):
+        raw = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stooq(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _Stub.hits, _Stub.queries = {}, []
+    monkeypatch.setattr(data, "STOOQ_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/")
+    monkeypatch.setattr(data, "STOOQ_BACKOFF", 0.0)
+    monkeypatch.setattr(data, "STOOQ_RETRIES", 2)
+    yield _Stub
+    server.shutdown()
+    server.server_close()
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def test_fetch_one_requests_range(stooq):
+    s = data._fetch_stooq_one("aaa", START)
+    assert s.name == "AAA"
+    assert list(s) == [100.0, 101.0, 102.0, 103.0, 104.0]
+    assert str(s.index.tz) == "UTC"
+    path, q = stooq.queries[0]
+    assert path == "/q/d/l/"
+    assert q["s"] == "aaa.us" and q["i"] == "d" and q["d1"] == "20240101"
+
+def test_transient_error_is_retried(stooq):
+    s = data._fetch_stooq_retrying("flk", START, data._get_stooq_session())
+    assert len(s) == 5
+    assert stooq.hits["flk.us"] == 2
+
+def test_retries_exhausted_raise_value_error(stooq):
+    with pytest.raises(ValueError, match="HTTP 503"):
+        data._fetch_stooq_retrying("dwn", START, data._get_stooq_session())
+    assert stooq.hits["dwn.us"] == 3
+
+def test_permanent_errors_are_not_retried(stooq):
+    with pytest.raises(ValueError, match="HTTP 404"):
+        data._fetch_stooq_retrying("bad", START, data._get_stooq_session())
+    with pytest.raises(ValueError, match="unexpected body"):
+        data._fetch_stooq_retrying("txt", START, data._get_stooq_session())
+    assert stooq.hits["bad.us"] == 1 and stooq.hits["txt.us"] == 1
+
+def test_fetch_many_keeps_partial_results(stooq):
+    df = data._fetch_stooq(["aaa", "flk", "bad"], START)
+    assert list(df.columns) == ["AAA", "FLK"]
+    assert len(df) == 5
+    assert set(df.attrs["errors"]) == {"BAD"}
+
+def test_fetch_many_all_failed(stooq):
+    with pytest.raises(ValueError, match="No usable prices from Stooq"):
+        data._fetch_stooq(["bad", "dwn"], START)